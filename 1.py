@@ -1,17 +1,15 @@
-import time
 import datetime
 import pandas as pd
-import re
-import io
 import os
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from drive_io import (get_catalog, partition_name, compact_partitions, upload_parquet,
+                      WatermarkManifest)
+from subiz_scraper import (ScrapePool, ScrapeJournal, scrape_with_network, extract_rows, open_report,
+                           wait_rows_stable, click_next_page, print_scrape_stats, RowDeduper)
 
 # ==============================================================================
 # 1. CẤU HÌNH HỆ THỐNG CỦA ĐẠI CA (GIỮ NGUYÊN DANH SÁCH)
@@ -34,6 +32,9 @@ AGENT_LIST = [
 ]
 
 DRIVE_FOLDER_ID = "1056rTo3LQ9vGhjUAJMEZLUCG98DJedRC"
+DRIVE_CATALOG = get_catalog(DRIVE_FOLDER_ID)
+SCRAPER_NAME = "1_hoi_thoai"  # tên sổ checkpoint + sổ watermark của script này
+WATERMARKS = WatermarkManifest(DRIVE_CATALOG, SCRAPER_NAME)
 DATA_TYPES = [
     "Ticket_Trong_Gio", "Ticket_Ngoai_Gio", 
     "Zalo_Trong_Gio", "Zalo_Ngoai_Gio",
@@ -59,59 +60,32 @@ def get_drive_service():
             token.write(creds.to_json())
     return build('drive', 'v3', credentials=creds)
 
-def download_file_by_name(service, file_name):
-    """Tải file từ Drive, trả về DataFrame và file_id"""
-    query = f"name = '{file_name}.parquet' and '{DRIVE_FOLDER_ID}' in parents and trashed = false"
-    results = service.files().list(q=query, fields="files(id)").execute()
-    files = results.get('files', [])
-
-    if files:
-        file_id = files[0]['id']
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
-        fh.seek(0)
-        try:
-            return pd.read_parquet(fh), file_id
-        except:
-            return pd.DataFrame(), file_id
-    return pd.DataFrame(), None
-
 def upload_to_drive(service, file_name, df, file_id=None):
-    """Đẩy dữ liệu lên Drive (Cập nhật hoặc Tạo mới)"""
-    buffer = io.BytesIO()
-    df.to_parquet(buffer, engine='pyarrow', index=False)
-    buffer.seek(0)
-    media = MediaIoBaseUpload(buffer, mimetype='application/octet-stream', resumable=True)
-    
-    if file_id:
-        service.files().update(fileId=file_id, media_body=media).execute()
-        print(f"      ✅ Đã đẩy bản cập nhật: {file_name} ({len(df)} dòng)")
-    else:
-        file_metadata = {'name': f"{file_name}.parquet", 'parents': [DRIVE_FOLDER_ID]}
-        service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        print(f"      🆕 Đã tạo mới file: {file_name} ({len(df)} dòng)")
+    """Đẩy dữ liệu lên Drive (Cập nhật hoặc Tạo mới), cột ép đúng kiểu theo schema chung ở drive_io"""
+    return upload_parquet(service, DRIVE_CATALOG, file_name, df, file_id)
 
 # ==============================================================================
 # 3. CORE SCRAPER (GIỮ NGUYÊN LOGIC LÌ LỢM)
 # ==============================================================================
 def scrape_data_classic(driver, url, agent_name, type_label):
-    driver.get(url)
-    time.sleep(10) 
-    scraped_data = []
-    total_items = 0
-    
-    try:
-        pagination_text_el = driver.find_element(By.XPATH, "//*[contains(text(), 'trong tổng số')]")
-        match = re.search(r"tổng số\s+(\d+)", pagination_text_el.text)
-        if match: total_items = int(match.group(1))
-    except:
-        try:
-            total_items = int(driver.find_element(By.CSS_SELECTOR, ".lead-actions__paginate-info b:last-child").text)
-        except: pass
+    # Chế độ network: đọc thẳng JSON API của trang, ra item y hệt bản cào DOM
+    def to_item(f):
+        if not f["customer"]: return None
+        return {
+            "Nhân viên hệ thống": agent_name,
+            "Loại": type_label,
+            "Khách hàng": f["customer"],
+            "Tags": f["tags"],
+            "Agent Subiz": f["agent"] or "N/A",
+            "Thời gian": f["created"]
+        }
+    return scrape_with_network(driver, url, "convo", type_label, to_item,
+                               lambda: scrape_data_dom(driver, url, agent_name, type_label))
+
+def scrape_data_dom(driver, url, agent_name, type_label):
+    # Chờ tới khi trang hiện tổng số dòng (thay cho sleep cố định)
+    total_items = open_report(driver, url, "convo")
+    scraped_data = RowDeduper(type_label, "convo") # Chống trùng bằng khóa hash, khỏi quét list
 
     if total_items == 0: return []
 
@@ -119,24 +93,24 @@ def scrape_data_classic(driver, url, agent_name, type_label):
         try:
             scroll = driver.find_element(By.CSS_SELECTOR, ".scroll-table-wrapper")
             driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", scroll)
-            time.sleep(1)
+            wait_rows_stable(driver, "convo")
             
-            rows = driver.find_elements(By.CSS_SELECTOR, "table.scroll-table tbody tr")
-            if not rows: rows = driver.find_elements(By.CSS_SELECTOR, "table.scroll-table tr")
+            # Cả trang về 1 lượt bằng JS, Python chỉ nhặt field
+            rows = extract_rows(driver)
             
             for row in rows:
                 try:
-                    user = row.find_element(By.CSS_SELECTOR, "span.ml-3").text.strip()
+                    user = row["user"]
                     if not user: continue
-                    tags = ", ".join([t.text.strip() for t in row.find_elements(By.CSS_SELECTOR, ".convo_tag__title")])
+                    tags = ", ".join(row["tags"])
                     
                     agent_subiz = "N/A"
-                    cols = row.find_elements(By.TAG_NAME, "td")
+                    cols = row["cells"]
                     if len(cols) > 6:
-                        try: agent_subiz = cols[6].find_element(By.TAG_NAME, "img").get_attribute("title")
-                        except: agent_subiz = cols[6].text.strip()
+                        agent_subiz = cols[6]["img"] if cols[6]["img"] is not None else cols[6]["text"]
 
-                    created_time = row.find_element(By.XPATH, ".//td[last()]//span[@title]").get_attribute("title")
+                    created_time = row["last_title"]
+                    if created_time is None: continue
                     
                     item = {
                         "Nhân viên hệ thống": agent_name,
@@ -146,58 +120,39 @@ def scrape_data_classic(driver, url, agent_name, type_label):
                         "Agent Subiz": agent_subiz,
                         "Thời gian": created_time
                     }
-                    if item not in scraped_data: scraped_data.append(item)
+                    scraped_data.add(item)
                 except: continue
         except: break
 
         if len(scraped_data) >= total_items: break
-        try:
-            next_btn = driver.find_element(By.CSS_SELECTOR, ".lead-actions__paginate button:last-child")
-            if next_btn.get_attribute("disabled"): break 
-            driver.execute_script("arguments[0].click();", next_btn)
-            time.sleep(4)
-        except: break
-    return scraped_data
+        if not click_next_page(driver, "convo"): break
+    return scraped_data.finish()
 
 # ==============================================================================
 # 4. LOGIC CHECK NGÀY MỚI (FAST & FURIOUS)
 # ==============================================================================
-def get_global_start_date(service):
+def get_start_dates(service):
     """
-    Check siêu tốc: Chỉ cần 1 file trong 8 file có ngày X
-    -> Coi như ngày X đã xong -> Trả về X + 1.
-    Không check dai dòng.
+    Đọc sổ watermark trên Drive (vài chục byte) thay vì tải cả file tìm max(Ngay_Cào).
+    Mỗi loại cào tiếp từ đúng mốc của nó, loại này xong ngày X không kéo loại khác nhảy qua X.
+    Trả về {loại: ngày cần cào tiếp}.
     """
     default_date = datetime.date(2026, 1, 1)
-    
-    print("\n🔍 Đang soi Drive để tìm ngày cào tiếp theo...")
+    print("\n🔍 Đang soi sổ watermark trên Drive...")
 
-    for dtype in DATA_TYPES:
-        print(f"   👀 Check nhanh file: {dtype}...", end=" ")
-        df, _ = download_file_by_name(service, dtype)
-        
-        if not df.empty and 'Ngay_Cào' in df.columns:
-            try:
-                dates = pd.to_datetime(df['Ngay_Cào'], format="%Y-%m-%d", errors='coerce').dt.date
-                dates = dates.dropna()
-                
-                if not dates.empty:
-                    local_max = dates.max()
-                    print(f"✅ Thấy ngày Max: {local_max}")
-                    
-                    # LOGIC ĂN TIỀN: Thấy phát chốt luôn, không check tiếp file khác
-                    start_date = local_max + datetime.timedelta(days=1)
-                    print(f"🎯 => CHỐT HẠ: Đã xong ngày {local_max}. Bắt đầu cày từ: {start_date}\n")
-                    return start_date
-                else:
-                    print("❌ File có nhưng lỗi ngày.")
-            except:
-                print("❌ Lỗi format ngày.")
+    marks = WATERMARKS.load(service, DATA_TYPES)
+    starts = {}
+    for dtype, mark in marks.items():
+        if mark:
+            starts[dtype] = datetime.date.fromisoformat(mark) + datetime.timedelta(days=1)
+            print(f"   ✅ {dtype}: xong đến {mark}")
         else:
-            print("❌ Trống hoặc không có file.")
+            starts[dtype] = default_date
+            print(f"   ⚠️ {dtype}: chưa có gì, cày từ đầu {default_date}")
 
-    print(f"⚠️ => Drive sạch bong, bắt đầu cày từ đầu: {default_date}\n")
-    return default_date
+    start_date = min(starts.values())
+    print(f"🎯 => CHỐT HẠ: Bắt đầu cày từ: {start_date}\n")
+    return starts
 
 # ==============================================================================
 # 5. RUNNER CHÍNH
@@ -207,17 +162,19 @@ def main():
     service = get_drive_service()
     
     # 1. Check ngày bắt đầu (Fast Check)
-    curr_date = get_global_start_date(service)
+    starts = get_start_dates(service)
+    curr_date = min(starts.values())
     yesterday = datetime.date.today() - datetime.timedelta(days=1)
     
     if curr_date > yesterday:
         print("😎 Dữ liệu đã mới nhất rồi đại ca ơi! Nghỉ ngơi tán gái thôi.")
         return
 
-    options = Options()
-    options.add_experimental_option("debuggerAddress", "127.0.0.1:9222")
+    # Mỗi worker 1 tab/1 Chrome riêng, số worker chỉnh ở SCRAPE_WORKERS bên subiz_scraper
+    pool = ScrapePool()
+    journal = ScrapeJournal(SCRAPER_NAME)
     try:
-        driver = webdriver.Chrome(options=options)
+        pool.start()
     except:
         print("🔥 Lỗi: Đại ca bật Chrome Debugger chưa đấy?")
         return
@@ -234,10 +191,12 @@ def main():
         # Kho chứa dữ liệu gom cho cả ngày
         daily_storage = {dtype: [] for dtype in DATA_TYPES}
 
-        # --- A. CÀO DỮ LIỆU ---
+        # --- A. CÀO DỮ LIỆU (XẾP JOB VÀO HÀNG ĐỢI, CÁC TAB CHIA NHAU CÀO) ---
+        jobs = []
         for agent in AGENT_LIST:
-            print(f"   👤 Đang quét: {agent['name']}")
             for dtype in DATA_TYPES:
+                # Loại này đã lên Drive tới ngày này rồi (mốc riêng của nó đi trước) thì bỏ qua
+                if curr_date < starts[dtype]: continue
                 # Cấu hình link phức tạp của Đại Ca
                 ch_t = "%5B%5C%22subiz%5C%22,%5C%22facebook%5C%22,%5C%22facebook_comment%5C%22,%5C%22instagram%5C%22,%5C%22instagram_comment%5C%22,%5C%22form%5C%22,%5C%22google_review%5C%22%5D"
                 ch_z = "%5B%5C%22zalo_personal%5C%22,%5C%22zalo%5C%22%5D"
@@ -259,25 +218,48 @@ def main():
                 else:
                     link = f"https://app.subiz.com.vn/new-reports/convo-list?conditions=%5B%7B%22key%22%3A%22created_time%22,%22value%22%3A%22%5B{t_range}%5D%22%7D,%7B%22key%22%3A%22business_hours%22,%22value%22%3A%22%5C%22{cfg['h']}%5C%22%22%7D,%7B%22key%22%3A%22replied_duration%22,%22replied_duration_gt%22%3A%22600000%22,%22replied_duration_lte%22%3A%2286400000%22,%22type%22%3A%22gt%22%7D,%7B%22key%22%3A%22first_replied_duration_of%22,%22first_replied_duration_of%22%3A%22%5C%22{agent['id']}%5C%22%22%7D,%7B%22key%22%3A%22channel%22,%22value%22%3A%22{cfg['c']}%22%7D%5D"
 
-                new_items = scrape_data_classic(driver, link, agent['name'], dtype)
-                if new_items:
-                    for item in new_items: item["Ngay_Cào"] = day_str
-                    daily_storage[dtype].extend(new_items)
+                jobs.append((dtype, f"{agent['name']} / {dtype}",
+                             lambda driver, link=link, name=agent['name'], dtype=dtype:
+                                 scrape_data_classic(driver, link, name, dtype)))
+
+        failed = pool.run(jobs, daily_storage, journal, day_str)
+        if failed:
+            # Không upload ngày thiếu job; job xong đã nằm trong sổ, chạy lại là cào tiếp đúng chỗ dở
+            print(f"🔥 {len(failed)} job lỗi ở ngày {day_str} ({', '.join(failed)}). Dừng ở đây, chạy lại sẽ cào tiếp!")
+            break
+        for items in daily_storage.values():
+            for item in items: item["Ngay_Cào"] = day_str
         
-        # --- B. UPLOAD DRIVE (GOM CẢ NGÀY MỚI ĐẨY) ---
+        # --- B. UPLOAD DRIVE (MỖI LOẠI 1 FILE PARTITION CHO NGÀY NÀY, KHỎI TẢI LỊCH SỬ VỀ GỘP) ---
         print(f"📦 [GOM HÀNG] Đã xong ngày {day_str}. Bắt đầu đẩy lên Drive...")
+        uploaded = True
         for dtype in DATA_TYPES:
             if daily_storage[dtype]:
-                df_old, f_id = download_file_by_name(service, dtype)
-                new_df = pd.DataFrame(daily_storage[dtype])
-                final_df = pd.concat([df_old, new_df], ignore_index=True)
-                upload_to_drive(service, dtype, final_df, f_id)
+                part = partition_name(dtype, day_str)
+                # Cào lại ngày cũ thì ghi đè đúng file ngày đó, không bị nhân đôi dòng
+                meta = DRIVE_CATALOG.find(service, f"{part}.parquet")
+                if not upload_to_drive(service, part, pd.DataFrame(daily_storage[dtype]), meta['id'] if meta else None):
+                    uploaded = False
             else:
                 # Không có dữ liệu thì thôi, không spam
                 pass
 
+        if not uploaded:
+            # Upload hỏng thì dừng, không nhích mốc -> lần sau cào lại đúng ngày này (job đã cào vẫn nằm trong sổ)
+            print(f"🔥 Upload ngày {day_str} chưa trọn vẹn, dừng ở đây. Chạy lại sẽ đẩy tiếp!")
+            break
+        # Lên Drive đủ rồi thì nhích mốc watermark + gạch ngày này khỏi sổ checkpoint
+        WATERMARKS.advance(service, DATA_TYPES, day_str)
+        journal.finish_day(day_str)
+
         curr_date += datetime.timedelta(days=1)
-    
+
+    # --- C. DỌN KHO: GỘP PARTITION NGÀY CỦA CÁC THÁNG ĐÃ QUA THÀNH FILE THÁNG ---
+    for dtype in DATA_TYPES:
+        compact_partitions(service, DRIVE_CATALOG, dtype, upload_to_drive)
+
+    pool.close()
+    print_scrape_stats()
     print("\n💎 HẾT NƯỚC CHẤM! Đã cập nhật xong xuôi tất cả!")
 
 if __name__ == "__main__":
@@ -1,14 +1,14 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 import pandas as pd
-import io
 import os
-import datetime
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from drive_io import get_catalog, read_dataset, parallel_download, DataRefresher, DURATION_COLUMN, add_duration_seconds
+from api_cache import ResponseCache, admin_allowed
+from report_engine import build_v1_cube, query_v1_cube, classify_products_v1, call_minutes_v1
 
 # ==============================================================================
 # 1. CẤU HÌNH (GIỮ NGUYÊN)
@@ -17,6 +17,7 @@ app = Flask(__name__)
 CORS(app) 
 
 DRIVE_FOLDER_ID = "1056rTo3LQ9vGhjUAJMEZLUCG98DJedRC"
+DRIVE_CATALOG = get_catalog(DRIVE_FOLDER_ID)
 SCOPES = ['https://www.googleapis.com/auth/drive']
 
 MASTER_PRODUCTS = [
@@ -36,6 +37,12 @@ SLA_FILES = [
 
 FILES_TO_LOAD = INTERACTION_FILES + SLA_FILES
 
+# Cube tổng hợp sẵn (dựng 1 lần trong load_all_data, request chỉ việc cắt lát)
+V1_CUBE = None
+
+# Kết quả API đã tính (gzip sẵn), phiên bản đổi mỗi lần load_all_data nạp data mới
+RESPONSE_CACHE = ResponseCache()
+
 # ==============================================================================
 # 2. HÀM KẾT NỐI & TẢI FILE
 # ==============================================================================
@@ -53,73 +60,17 @@ def get_drive_service():
 
 def download_df(service, filename):
     try:
-        query = f"name = '{filename}.parquet' and '{DRIVE_FOLDER_ID}' in parents and trashed = false"
-        results = service.files().list(q=query, fields="files(id)").execute()
-        files = results.get('files', [])
-        if not files: return pd.DataFrame()
-        request = service.files().get_media(fileId=files[0]['id'])
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done: _, done = downloader.next_chunk()
-        fh.seek(0)
-        return pd.read_parquet(fh)
+        # File gốc + partition tháng/ngày, Drive chưa có bản mới thì đọc luôn cache trên ổ (memory-map)
+        df, _ = read_dataset(service, DRIVE_CATALOG, filename)
+        return df if df is not None else pd.DataFrame()
     except: return pd.DataFrame()
 
-# ==============================================================================
-# 3. LOGIC XỬ LÝ DỮ LIỆU
-# ==============================================================================
-def detect_product_v3(row, src):
-    tags = str(row.get('Tags', '')).upper()
-    if "Call_Den" in src: return "Tổng đài GỌI VÀO"
-    if "Call_Di" in src: return "Tổng đài GỌI RA"
-    if "MBHXH" in tags: return "Hỗ trợ BHXH"
-    if "Ticket" in src:
-        if "EINVOICE1.0" in tags: return "Subiz 1.0"
-        if "EINVOICE2.0" in tags or "EINVOICE2.0" in tags: return "Subiz 2.0"
-        if "SMI" in tags: return "SMI (Hóa Đơn)"
-        if "MTNCN" in tags: return "MCTTNCN (Thuế)"
-        if "CKS" in tags: return "Hỗ trợ CKS"
-        if "M2SALE" in tags: return "M2SALE"
-        if "MSELLER" in tags: return "MSELLER (Máy POS)"
-    if "Zalo" in src: return "Zalo OA"
-    return "Sản phẩm khác"
-
-def parse_minutes(row, src):
-    if "Call" not in src: return 0.0
-    s = str(row.get('Thời lượng', '')).lower()
-    try:
-        if "phút" in s:
-            parts = s.split("phút")
-            m = float(parts[0].strip())
-            if "giây" in parts[1]: m += float(parts[1].replace("giây", "").strip()) / 60
-            return m
-        if ":" in s:
-            p = list(map(int, s.split(":")))
-            if len(p) == 3: return p[0]*60 + p[1] + p[2]/60
-            if len(p) == 2: return p[0] + p[1]/60
-    except: pass
-    return 0.0
-
-def calculate_growth(current_val, prev_val):
-    if prev_val == 0:
-        return 100 if current_val > 0 else 0
-    return round(((current_val - prev_val) / prev_val) * 100, 1)
-
-# ==============================================================================
-# 4. API ENDPOINT
-# ==============================================================================
-@app.route('/api/get-data', methods=['GET'])
-def get_dashboard_data():
-    date_start_str = request.args.get('start')
-    date_end_str = request.args.get('end')
-    
-    # 1. Tải tất cả file từ Drive
-    service = get_drive_service()
+def build_cube():
+    """Tải hết file (file Drive chưa đổi thì đọc cache ổ cứng) rồi dựng Cube mới. Không có data thì trả None."""
+    frames, _ = parallel_download(FILES_TO_LOAD, download_df, get_drive_service)
     all_data = []
-    
-    for fname in FILES_TO_LOAD:
-        df = download_df(service, fname)
+
+    for fname, df in frames.items():
         if not df.empty:
             df['Source_File'] = fname
             df['Is_Interaction'] = 1 if fname in INTERACTION_FILES else 0
@@ -127,133 +78,62 @@ def get_dashboard_data():
             time_col = 'Thời gian' if 'Thời gian' in df.columns else 'Thời gian tạo'
             df['Date_Obj'] = pd.to_datetime(df[time_col], errors='coerce')
             all_data.append(df)
-            
-    if not all_data: return jsonify({}) 
 
-    full_df = pd.concat(all_data, ignore_index=True)
-    full_df['Product_Label'] = full_df.apply(lambda x: detect_product_v3(x, x['Source_File']), axis=1)
-    full_df['Minutes'] = full_df.apply(lambda x: parse_minutes(x, x['Source_File']), axis=1)
+    if not all_data: return None
 
-    # 2. Xác định khoảng thời gian lọc & khoảng so sánh (để tính Growth)
-    d_start = pd.to_datetime(date_start_str).date()
-    d_end = pd.to_datetime(date_end_str).date()
-    
-    # Tính delta ngày để tìm kỳ trước (Previous Period)
-    delta_days = (d_end - d_start).days + 1
-    d_prev_end = d_start - datetime.timedelta(days=1)
-    d_prev_start = d_prev_end - datetime.timedelta(days=delta_days - 1)
-
-    # 3. Chia dữ liệu thành 2 tập: Hiện tại và Quá khứ
-    df_curr = full_df[(full_df['Date_Obj'].dt.date >= d_start) & (full_df['Date_Obj'].dt.date <= d_end)]
-    df_prev = full_df[(full_df['Date_Obj'].dt.date >= d_prev_start) & (full_df['Date_Obj'].dt.date <= d_prev_end)]
-
-    total_room_interaction = len(df_curr[df_curr['Is_Interaction'] == 1])
+    full_df = pd.concat(all_data, ignore_index=True)
+    # Gắn nhãn sản phẩm & số phút 1 lần lúc load (vector hóa, không apply từng dòng nữa)
+    tags = full_df['Tags'] if 'Tags' in full_df.columns else pd.Series("", index=full_df.index)
+    full_df['Product_Label'] = classify_products_v1(tags, full_df['Source_File'], categories=MASTER_PRODUCTS)
+    full_df['Minutes'] = call_minutes_v1(add_duration_seconds(full_df).get(DURATION_COLUMN), full_df['Source_File'])
+    return build_v1_cube(full_df)
+
+def load_all_data():
+    """Tải hết file về 1 lần rồi dựng Cube, không phải tải lại mỗi request nữa."""
+    global V1_CUBE
+    service = get_drive_service() # Refresh token trước ở luồng chính
+    print("\n📦 [Map 1] Đang tải data & dựng Cube...")
+    V1_CUBE = build_cube()
+    RESPONSE_CACHE.bump()
+    REFRESHER.mark(service)
+    REFRESHER.start()
+    print("🚀 [Map 1] Cube sẵn sàng!\n")
+
+def apply_changes(service, changed):
+    """Hot reload: Drive có file mới -> dựng Cube mới xong mới tráo, request đang chạy vẫn dùng Cube cũ."""
+    global V1_CUBE
+    V1_CUBE = build_cube()
+    RESPONSE_CACHE.bump()
+
+# Luồng nền hỏi Drive mỗi REFRESH_INTERVAL giây, có file mới là dựng lại Cube, khỏi restart server
+REFRESHER = DataRefresher("map_1", DRIVE_CATALOG, FILES_TO_LOAD, get_drive_service, apply_changes)
 
-    output_db = {}
-    agents = [a for a in full_df['Nhân viên hệ thống'].unique() if a]
+# ==============================================================================
+# 3. API ENDPOINT
+# ==============================================================================
+@app.route('/api/get-data', methods=['GET'])
+@RESPONSE_CACHE.cached
+def get_dashboard_data():
+    date_start_str = request.args.get('start')
+    date_end_str = request.args.get('end')
     
-    for agent in agents:
-        # --- Lấy dữ liệu của Agent ---
-        u_curr = df_curr[df_curr['Nhân viên hệ thống'] == agent]
-        u_prev = df_prev[df_prev['Nhân viên hệ thống'] == agent]
+    # 1. Lấy Cube đã dựng sẵn (chưa có thì tải)
+    if V1_CUBE is None: load_all_data()
+    if not V1_CUBE: return jsonify({})
 
-        if u_curr.empty and u_prev.empty:
-            continue
-
-        # --- Tổng hợp số liệu Tổng quát ---
-        u_curr_inter = u_curr[u_curr['Is_Interaction'] == 1]
-        u_prev_inter = u_prev[u_prev['Is_Interaction'] == 1]
-        
-        # Trong giờ / Ngoài giờ
-        t_in = len(u_curr_inter[u_curr_inter['Source_File'].str.contains('Trong_Gio')])
-        t_out = len(u_curr_inter[u_curr_inter['Source_File'].str.contains('Ngoai_Gio')])
-        total_curr = t_in + t_out
-        total_prev = len(u_prev_inter)
-
-        # SLA stats
-        u_curr_sla = u_curr[u_curr['Is_SLA_File'] == 1]
-        u_prev_sla = u_prev[u_prev['Is_SLA_File'] == 1]
-        
-        sla_count_curr = len(u_curr_sla)
-        sla_count_prev = len(u_prev_sla)
-
-        # Tính toán Growth Tổng
-        total_growth = calculate_growth(total_curr, total_prev)
-        sla_growth = calculate_growth(sla_count_curr, sla_count_prev)
-
-        # --- Tổng hợp từng Metric (Sản phẩm) ---
-        metrics = []
-        for p in MASTER_PRODUCTS:
-            # Lọc theo sản phẩm ở kỳ hiện tại
-            p_curr = u_curr[u_curr['Product_Label'] == p]
-            p_curr_inter = p_curr[p_curr['Is_Interaction'] == 1]
-            
-            # Lọc theo sản phẩm ở kỳ trước
-            p_prev = u_prev[u_prev['Product_Label'] == p]
-            p_prev_inter = p_prev[p_prev['Is_Interaction'] == 1]
-
-            # Số liệu chi tiết
-            p_in = len(p_curr_inter[p_curr_inter['Source_File'].str.contains('Trong_Gio')])
-            p_out = len(p_curr_inter[p_curr_inter['Source_File'].str.contains('Ngoai_Gio')])
-            p_total_curr = p_in + p_out
-            p_total_prev = len(p_prev_inter)
-            
-            p_sla_count = len(p_curr[p_curr['Is_SLA_File'] == 1])
-            min_val = round(p_curr['Minutes'].sum(), 2) if "Tổng đài" in p else None
-            
-            # Tính Growth từng sản phẩm
-            p_growth = calculate_growth(p_total_curr, p_total_prev)
-            
-            metrics.append({
-                "id": p, "name": p, "in": p_in, "out": p_out, "sla": p_sla_count,
-                "growth": p_growth, "minutes": min_val
-            })
-
-        # --- Logic Hourly Series (Dữ liệu biểu đồ giờ) ---
-        hourly_series = []
-        if not u_curr_inter.empty:
-            for p in MASTER_PRODUCTS:
-                p_inter = u_curr_inter[u_curr_inter['Product_Label'] == p]
-                if not p_inter.empty:
-                    # Group theo giờ (0-23)
-                    counts = p_inter.groupby(p_inter['Date_Obj'].dt.hour).size().reindex(range(24), fill_value=0).tolist()
-                    if sum(counts) > 0:
-                        hourly_series.append({"label": p, "data": counts})
-
-        # --- Logic Scatter Data (Mật độ lỗi SLA) ---
-        scatter_sla = []
-        if not u_curr_sla.empty:
-            for _, row in u_curr_sla.iterrows():
-                if pd.notnull(row['Date_Obj']):
-                    scatter_sla.append({
-                        "x": row['Date_Obj'].isoformat(),
-                        "y": round(row['Date_Obj'].hour + row['Date_Obj'].minute/60, 2),
-                        "label": row['Product_Label']
-                    })
+    # 2. Xác định khoảng thời gian lọc (kỳ trước để tính Growth do engine tự lo)
+    d_start = pd.to_datetime(date_start_str).date()
+    d_end = pd.to_datetime(date_end_str).date()
 
-        # Đóng gói dữ liệu trả về
-        output_db[agent] = {
-            "name": agent,
-            "avatar": agent[:2].upper(),
-            "workDays": f"{u_curr['Date_Obj'].dt.date.nunique()} ngày",
-            "totalIn": t_in, "totalOut": t_out, "total": total_curr,
-            "totalRoom": total_room_interaction,
-            "growth": total_growth, # Đã có giá trị thật
-            "stats": {
-                "slaCount": sla_count_curr, 
-                "slaGrowth": sla_growth # Đã có giá trị thật
-            },
-            "metrics": metrics,
-            "charts": {
-                "dailyIn": u_curr_inter[u_curr_inter['Source_File'].str.contains('Trong_Gio')].groupby(u_curr_inter['Date_Obj'].dt.weekday).size().reindex(range(7), fill_value=0).tolist(),
-                "dailyOut": u_curr_inter[u_curr_inter['Source_File'].str.contains('Ngoai_Gio')].groupby(u_curr_inter['Date_Obj'].dt.weekday).size().reindex(range(7), fill_value=0).tolist(),
-                "dailySLA": u_curr_sla.groupby(u_curr_sla['Date_Obj'].dt.weekday).size().reindex(range(7), fill_value=0).tolist(),
-                "hourlySeries": hourly_series
-            },
-            "scatterData": {"sla": scatter_sla}
-        }
+    # 3. Cắt lát Cube theo ngày rồi cộng lại -> nhanh theo số ngày chứ không theo số dòng
+    return jsonify(query_v1_cube(V1_CUBE, d_start, d_end, MASTER_PRODUCTS))
 
-    return jsonify(output_db)
+@app.route('/api/admin/reload', methods=['POST'])
+def admin_reload():
+    """Bảo server nạp lại data ngay (header X-Reload-Token, ?full=1 là nạp lại hết)."""
+    if not admin_allowed(): return jsonify({"error": "Sai token"}), 403
+    changed = DataRefresher.check_all(force=request.args.get('full') == '1')
+    return jsonify({"changed": changed, "version": RESPONSE_CACHE.version})
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
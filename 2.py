@@ -1,17 +1,16 @@
-import time
 import datetime
 import pandas as pd
 import re
-import io
 import os
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from drive_io import (get_catalog, partition_name, compact_partitions, upload_parquet,
+                      WatermarkManifest, DURATION_COLUMN, duration_seconds)
+from subiz_scraper import (ScrapePool, ScrapeJournal, scrape_with_network, extract_rows, open_report,
+                           wait_rows_stable, click_next_page, print_scrape_stats, RowDeduper)
 
 # ==============================================================================
 # 1. CẤU HÌNH HỆ THỐNG (ĐỒ CHƠI CỦA ĐẠI CA)
@@ -34,6 +33,9 @@ AGENT_LIST = [
 ]
 
 DRIVE_FOLDER_ID = "1056rTo3LQ9vGhjUAJMEZLUCG98DJedRC"
+DRIVE_CATALOG = get_catalog(DRIVE_FOLDER_ID)
+SCRAPER_NAME = "2_call"  # tên sổ checkpoint + sổ watermark của script này
+WATERMARKS = WatermarkManifest(DRIVE_CATALOG, SCRAPER_NAME)
 
 DATA_TYPES = [
     "Call_Den_Trong_Gio", 
@@ -61,60 +63,52 @@ def get_drive_service():
             token.write(creds.to_json())
     return build('drive', 'v3', credentials=creds)
 
-def download_file_by_name(service, file_name):
-    """Lôi cổ file trên Drive về để xem xét."""
-    query = f"name = '{file_name}.parquet' and '{DRIVE_FOLDER_ID}' in parents and trashed = false"
-    results = service.files().list(q=query, fields="files(id)").execute()
-    files = results.get('files', [])
-    if files:
-        file_id = files[0]['id']
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
-        fh.seek(0)
-        try:
-            return pd.read_parquet(fh), file_id
-        except Exception as e:
-            print(f"      ☠️ Lỗi đọc file parquet {file_name}: {e}")
-            return pd.DataFrame(), file_id
-    return pd.DataFrame(), None
-
 def upload_to_drive(service, file_name, df, file_id=None):
-    """Đẩy hàng nóng lên mây."""
-    buffer = io.BytesIO()
-    df.to_parquet(buffer, engine='pyarrow', index=False)
-    buffer.seek(0)
-    media = MediaIoBaseUpload(buffer, mimetype='application/octet-stream', resumable=True)
-    
-    try:
-        if file_id:
-            service.files().update(fileId=file_id, media_body=media).execute()
-            print(f"      ✅ [Update] {file_name} ngon lành cành đào ({len(df)} dòng).")
-        else:
-            file_metadata = {'name': f"{file_name}.parquet", 'parents': [DRIVE_FOLDER_ID]}
-            service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-            print(f"      🆕 [New] {file_name} đập hộp thành công ({len(df)} dòng).")
-    except Exception as e:
-        print(f"      🔥 [LỖI] Không đẩy được file {file_name}: {e}")
+    """Đẩy hàng nóng lên mây (giờ -> timestamp, Duration_Sec -> int32, lỗi thì trả None)."""
+    return upload_parquet(service, DRIVE_CATALOG, file_name, df, file_id)
 
 # ==============================================================================
 # 3. CORE SCRAPER - FORMAT CHUẨN & LỌC RÁC
 # ==============================================================================
+def normalize_call_duration(raw_time):
+    """Format lại thời lượng, cuộc 0s thì trả None để bỏ qua."""
+    # -- Format lại "50 giây" thành "0 phút 50 giây" --
+    if re.match(r'^\d+\s*giây$', raw_time):
+         thoi_luong = f"0 phút {raw_time}"
+    else:
+        thoi_luong = raw_time
+
+    # -- Bộ lọc thông minh --
+    has_real_value = False
+    for char in thoi_luong:
+        if char.isdigit() and char != '0':
+            has_real_value = True
+            break
+    return thoi_luong if has_real_value else None
+
 def scrape_call_data(driver, url, agent_name, type_label):
-    driver.get(url)
-    time.sleep(6) # Nghỉ tí cho mạng nó load
-    
-    scraped_data = []
-    total_items = 0
-    
-    try:
-        pagination_text_el = driver.find_element(By.XPATH, "//*[contains(text(), 'trong tổng số')]")
-        match = re.search(r"tổng số\s+(\d+)", pagination_text_el.text)
-        if match: total_items = int(match.group(1))
-    except: pass
+    # Chế độ network: đọc thẳng JSON API của trang, ra item y hệt bản cào DOM
+    def to_item(f):
+        thoi_luong = normalize_call_duration(f["duration"])
+        if not thoi_luong: return None
+        return {
+            "SDT": f["phone"] or "N/A",
+            "Trạng thái": f["status"] or "N/A",
+            "Tags": f["tags"],
+            "Thời lượng": thoi_luong,
+            DURATION_COLUMN: duration_seconds(thoi_luong),
+            "Agent thực hiện": f["agent"],
+            "Thời gian tạo": f["created"],
+            "Nhân viên hệ thống": agent_name,
+            "Loại cuộc gọi": type_label
+        }
+    return scrape_with_network(driver, url, "call", type_label, to_item,
+                               lambda: scrape_call_dom(driver, url, agent_name, type_label))
+
+def scrape_call_dom(driver, url, agent_name, type_label):
+    # Chờ tới khi trang hiện tổng số dòng (thay cho sleep cố định)
+    total_items = open_report(driver, url, "call")
+    scraped_data = RowDeduper(type_label, "call") # Chống trùng bằng khóa hash, khỏi quét list
 
     if total_items == 0: return []
 
@@ -122,75 +116,50 @@ def scrape_call_data(driver, url, agent_name, type_label):
         try:
             scroll = driver.find_element(By.CSS_SELECTOR, ".scroll-table-wrapper")
             driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", scroll)
-            time.sleep(1.5)
+            wait_rows_stable(driver, "call")
             
-            rows = driver.find_elements(By.CSS_SELECTOR, "table.scroll-table tbody tr")
-            if not rows: rows = driver.find_elements(By.CSS_SELECTOR, "table.scroll-table tr")
+            # Cả trang về 1 lượt bằng JS, Python chỉ nhặt field
+            rows = extract_rows(driver)
             
             for row in rows:
                 try:
-                    cols = row.find_elements(By.TAG_NAME, "td")
+                    cols = row["cells"]
                     if len(cols) < 8: continue 
 
                     # 4. XỬ LÝ THỜI LƯỢNG (VIP PRO MAX)
-                    try:
-                        raw_time = cols[4].get_attribute("textContent").strip()
-                    except: raw_time = "0 phút"
-
-                    # -- Format lại "50 giây" thành "0 phút 50 giây" --
-                    if re.match(r'^\d+\s*giây$', raw_time):
-                         thoi_luong = f"0 phút {raw_time}"
-                    else:
-                        thoi_luong = raw_time
-
-                    # -- Bộ lọc thông minh --
-                    has_real_value = False
-                    for char in thoi_luong:
-                        if char.isdigit() and char != '0':
-                            has_real_value = True
-                            break
-                    
-                    if not has_real_value: continue # Bỏ qua mấy cuộc 0s
+                    raw_time = cols[4]["content"]
+
+                    thoi_luong = normalize_call_duration(raw_time)
+                    if not thoi_luong: continue # Bỏ qua mấy cuộc 0s
 
                     # 1. SĐT
-                    try: sdt = cols[1].text.strip()
-                    except: sdt = "N/A"
+                    sdt = cols[1]["text"]
 
                     # 2. Trạng thái
-                    try: trang_thai = cols[2].text.strip()
-                    except: trang_thai = "N/A"
+                    trang_thai = cols[2]["text"]
 
                     # 3. Tags
-                    try:
-                        tag_elements = cols[3].find_elements(By.CSS_SELECTOR, ".convo_tag__title")
-                        tags = ", ".join([t.text.strip() for t in tag_elements])
-                    except: tags = ""
+                    tags = ", ".join(cols[3]["tags"])
 
                     # 5. Agent
-                    try:
-                        agent_img = cols[6].find_element(By.TAG_NAME, "img")
-                        agent_real = agent_img.get_attribute("title")
-                    except: 
-                        agent_real = cols[6].text.strip()
+                    agent_real = cols[6]["img"] if cols[6]["img"] is not None else cols[6]["text"]
 
                     # 6. Thời gian tạo
-                    try:
-                        time_span = cols[7].find_element(By.TAG_NAME, "span")
-                        created_time = time_span.get_attribute("title")
-                    except: created_time = "N/A"
+                    created_time = cols[7]["span"] if cols[7]["span"] is not None else "N/A"
 
                     item = {
                         "SDT": sdt,
                         "Trạng thái": trang_thai,
                         "Tags": tags,
                         "Thời lượng": thoi_luong, # Đã format đẹp trai
+                        DURATION_COLUMN: duration_seconds(thoi_luong), # Số giây parse sẵn, server khỏi đọc chữ
                         "Agent thực hiện": agent_real,
                         "Thời gian tạo": created_time,
                         "Nhân viên hệ thống": agent_name,
                         "Loại cuộc gọi": type_label
                     }
                     
-                    if item not in scraped_data: scraped_data.append(item)
+                    scraped_data.add(item)
                 except Exception as e:
                     continue 
 
@@ -198,56 +167,35 @@ def scrape_call_data(driver, url, agent_name, type_label):
 
         if len(scraped_data) >= total_items: break
         
-        try:
-            next_btn = driver.find_element(By.CSS_SELECTOR, ".lead-actions__paginate button:last-child")
-            if next_btn.get_attribute("disabled"): break 
-            driver.execute_script("arguments[0].click();", next_btn)
-            time.sleep(3)
-        except: break
+        if not click_next_page(driver, "call"): break
         
-    return scraped_data
+    return scraped_data.finish()
 
 # ==============================================================================
 # 4. LOGIC CHECK NGÀY MỚI - FAST & FURIOUS
 # ==============================================================================
-def get_global_start_date(service):
+def get_start_dates(service):
     """
-    Check kiểu 'đánh nhanh rút gọn'.
-    Chỉ cần 1 file có dữ liệu -> Lấy Max Date -> +1 ngày -> Chốt luôn (Return ngay).
-    Không cần check 3 file còn lại.
+    Đọc sổ watermark trên Drive (vài chục byte) thay vì tải cả file tìm max(Ngay_Cào).
+    Mỗi loại cào tiếp từ đúng mốc của nó, loại này xong ngày X không kéo loại khác nhảy qua X.
+    Trả về {loại: ngày cần cào tiếp}.
     """
     default_date = datetime.date(2026, 1, 1)
-    
-    print("\n🔍 Đệ đang check nhanh Drive để chốt ngày cày...")
+    print("\n🔍 Đang soi sổ watermark trên Drive...")
 
-    for dtype in DATA_TYPES:
-        print(f"   👀 Ngó qua file: {dtype}...", end=" ")
-        df, _ = download_file_by_name(service, dtype)
-        
-        # Nếu file có dữ liệu và có cột Ngay_Cào
-        if not df.empty and 'Ngay_Cào' in df.columns:
-            try:
-                dates = pd.to_datetime(df['Ngay_Cào'], format="%Y-%m-%d", errors='coerce').dt.date
-                dates = dates.dropna()
-                
-                if not dates.empty:
-                    local_max = dates.max()
-                    print(f"✅ Thấy ngày {local_max}.")
-                    
-                    # LOGIC QUAN TRỌNG: Thấy phát là chốt luôn, không check tiếp
-                    start_date = local_max + datetime.timedelta(days=1)
-                    print(f"🎯 => CHỐT HẠ: Dữ liệu đã update đủ đến {local_max}. Bắt đầu cày từ: {start_date}\n")
-                    return start_date
-                else:
-                    print("❌ File có nhưng lỗi ngày. Check tiếp file sau...")
-            except Exception as e:
-                print(f"❌ Lỗi format: {e}. Check tiếp file sau...")
+    marks = WATERMARKS.load(service, DATA_TYPES)
+    starts = {}
+    for dtype, mark in marks.items():
+        if mark:
+            starts[dtype] = datetime.date.fromisoformat(mark) + datetime.timedelta(days=1)
+            print(f"   ✅ {dtype}: xong đến {mark}")
         else:
-            print("❌ Trống hoặc không có file. Check tiếp file sau...")
+            starts[dtype] = default_date
+            print(f"   ⚠️ {dtype}: chưa có gì, cày từ đầu {default_date}")
 
-    # Nếu check hết 4 file mà vẫn không thấy gì
-    print(f"⚠️ => Drive sạch bong, bắt đầu cày từ đầu: {default_date}\n")
-    return default_date
+    start_date = min(starts.values())
+    print(f"🎯 => CHỐT HẠ: Bắt đầu cày từ: {start_date}\n")
+    return starts
 
 # ==============================================================================
 # 5. MAIN FUNCTION
@@ -257,7 +205,8 @@ def main():
     service = get_drive_service()
     
     # 1. Check ngày bắt đầu (gặp phát chốt luôn)
-    curr_date = get_global_start_date(service)
+    starts = get_start_dates(service)
+    curr_date = min(starts.values())
     yesterday = datetime.date.today() - datetime.timedelta(days=1)
     
     if curr_date > yesterday:
@@ -265,10 +214,10 @@ def main():
         return
 
     # 2. Khởi động trình duyệt
-    options = Options()
-    options.add_experimental_option("debuggerAddress", "127.0.0.1:9222")
+    pool = ScrapePool()
+    journal = ScrapeJournal(SCRAPER_NAME)
     try:
-        driver = webdriver.Chrome(options=options)
+        pool.start()
     except:
         print("🔥 Lỗi: Đại ca bật Chrome Debugger chưa đấy?")
         return
@@ -285,10 +234,10 @@ def main():
         
         daily_storage = {dtype: [] for dtype in DATA_TYPES}
 
-        # --- A. CÀO DỮ LIỆU ---
+        # --- A. CÀO DỮ LIỆU (XẾP JOB VÀO HÀNG ĐỢI, CÁC TAB CHIA NHAU CÀO) ---
+        jobs = []
         for agent in AGENT_LIST:
-            print(f"   👤 {agent['name']} đang làm việc...", end="\r")
-            
+
             url_configs = {
                 "Call_Den_Trong_Gio": f"https://app.subiz.com.vn/new-reports/call-list?conditions=%5B%7B%22key%22%3A%22created_time%22,%22value%22%3A%22%5B{t_range}%5D%22%7D,%7B%22key%22%3A%22agent%22,%22value%22%3A%22%5C%22{agent['id']}%5C%22%22%7D,%7B%22key%22%3A%22direction%22,%22value%22%3A%22%5C%22inbound%5C%22%22%7D,%7B%22key%22%3A%22business_hours%22,%22value%22%3A%22%5C%22true%5C%22%22%7D%5D",
                 "Call_Di_Trong_Gio":  f"https://app.subiz.com.vn/new-reports/call-list?conditions=%5B%7B%22key%22%3A%22created_time%22,%22value%22%3A%22%5B{t_range}%5D%22%7D,%7B%22key%22%3A%22agent%22,%22value%22%3A%22%5C%22{agent['id']}%5C%22%22%7D,%7B%22key%22%3A%22direction%22,%22value%22%3A%22%5C%22outbound%5C%22%22%7D,%7B%22key%22%3A%22business_hours%22,%22value%22%3A%22%5C%22true%5C%22%22%7D%5D",
@@ -297,26 +246,51 @@ def main():
             }
 
             for dtype in DATA_TYPES:
-                link = url_configs[dtype]
-                new_items = scrape_call_data(driver, link, agent['name'], dtype)
-                if new_items:
-                    for item in new_items: item["Ngay_Cào"] = day_str
-                    daily_storage[dtype].extend(new_items)
+                # Loại này đã lên Drive tới ngày này rồi (mốc riêng của nó đi trước) thì bỏ qua
+                if curr_date < starts[dtype]: continue
+                jobs.append((dtype, f"{agent['name']} / {dtype}",
+                             lambda driver, link=url_configs[dtype], name=agent['name'], dtype=dtype:
+                                 scrape_call_data(driver, link, name, dtype)))
+
+        failed = pool.run(jobs, daily_storage, journal, day_str)
+        if failed:
+            # Không upload ngày thiếu job; job xong đã nằm trong sổ, chạy lại là cào tiếp đúng chỗ dở
+            print(f"🔥 {len(failed)} job lỗi ở ngày {day_str} ({', '.join(failed)}). Dừng ở đây, chạy lại sẽ cào tiếp!")
+            break
+        for items in daily_storage.values():
+            for item in items: item["Ngay_Cào"] = day_str
         
         # --- B. UPLOAD DRIVE (LÀM MỘT LẦN CHO CẢ NGÀY) ---
-        print(f"\n📦 [GOM HÀNG] Đã cào xong ngày {day_str}. Bắt đầu đẩy lên Drive...")
+        print(f"📦 [GOM HÀNG] Đã cào xong ngày {day_str}. Bắt đầu đẩy lên Drive...")
         
+        # Mỗi loại 1 file partition cho ngày này, khỏi tải cả lịch sử về gộp
+        uploaded = True
         for dtype in DATA_TYPES:
             if daily_storage[dtype]:
-                df_old, f_id = download_file_by_name(service, dtype)
-                new_df = pd.DataFrame(daily_storage[dtype])
-                final_df = pd.concat([df_old, new_df], ignore_index=True)
-                upload_to_drive(service, dtype, final_df, f_id)
+                part = partition_name(dtype, day_str)
+                # Cào lại ngày cũ thì ghi đè đúng file ngày đó, không bị nhân đôi dòng
+                meta = DRIVE_CATALOG.find(service, f"{part}.parquet")
+                if not upload_to_drive(service, part, pd.DataFrame(daily_storage[dtype]), meta['id'] if meta else None):
+                    uploaded = False
             else:
                 pass 
 
+        if not uploaded:
+            # Upload hỏng thì dừng, không nhích mốc -> lần sau cào lại đúng ngày này (job đã cào vẫn nằm trong sổ)
+            print(f"🔥 Upload ngày {day_str} chưa trọn vẹn, dừng ở đây. Chạy lại sẽ đẩy tiếp!")
+            break
+        # Lên Drive đủ rồi thì nhích mốc watermark + gạch ngày này khỏi sổ checkpoint
+        WATERMARKS.advance(service, DATA_TYPES, day_str)
+        journal.finish_day(day_str)
+
         curr_date += datetime.timedelta(days=1)
-    
+
+    # --- C. DỌN KHO: GỘP PARTITION NGÀY CỦA CÁC THÁNG ĐÃ QUA THÀNH FILE THÁNG ---
+    for dtype in DATA_TYPES:
+        compact_partitions(service, DRIVE_CATALOG, dtype, upload_to_drive)
+
+    pool.close()
+    print_scrape_stats()
     print("\n💎 NHIỆM VỤ HOÀN THÀNH! Đại ca về nghỉ ngơi đi ạ!")
 
 if __name__ == "__main__":
@@ -1,23 +1,24 @@
-import time
 import datetime
 import pandas as pd
-import re
-import io
 import os
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from drive_io import (get_catalog, partition_name, compact_partitions, upload_parquet,
+                      WatermarkManifest)
+from subiz_scraper import (ScrapePool, ScrapeJournal, scrape_with_network, extract_rows, open_report,
+                           wait_rows_stable, click_next_page, print_scrape_stats, RowDeduper)
 
 # ==============================================================================
 # 1. CẤU HÌNH HỆ THỐNG - KHÔNG CẦN DANH SÁCH NHÂN VIÊN
 # ==============================================================================
 # ID Folder Drive của Đại Ca
 DRIVE_FOLDER_ID = "1056rTo3LQ9vGhjUAJMEZLUCG98DJedRC"
+DRIVE_CATALOG = get_catalog(DRIVE_FOLDER_ID)
+SCRAPER_NAME = "3_miss"  # tên sổ checkpoint + sổ watermark của script này
+WATERMARKS = WatermarkManifest(DRIVE_CATALOG, SCRAPER_NAME)
 
 # Định nghĩa các loại dữ liệu cần cào (Tên file trên Drive)
 DATA_CONFIG = {
@@ -46,44 +47,9 @@ def get_drive_service():
             token.write(creds.to_json())
     return build('drive', 'v3', credentials=creds)
 
-def download_file_by_name(service, file_name):
-    """Kéo file về check hàng."""
-    query = f"name = '{file_name}.parquet' and '{DRIVE_FOLDER_ID}' in parents and trashed = false"
-    results = service.files().list(q=query, fields="files(id)").execute()
-    files = results.get('files', [])
-
-    if files:
-        file_id = files[0]['id']
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
-        fh.seek(0)
-        try:
-            return pd.read_parquet(fh), file_id
-        except:
-            return pd.DataFrame(), file_id
-    return pd.DataFrame(), None
-
 def upload_to_drive(service, file_name, df, file_id=None):
-    """Đẩy hàng nóng lên mây."""
-    buffer = io.BytesIO()
-    df.to_parquet(buffer, engine='pyarrow', index=False)
-    buffer.seek(0)
-    media = MediaIoBaseUpload(buffer, mimetype='application/octet-stream', resumable=True)
-    
-    try:
-        if file_id:
-            service.files().update(fileId=file_id, media_body=media).execute()
-            print(f"      ✅ [Update] {file_name} ngon choét ({len(df)} dòng).")
-        else:
-            file_metadata = {'name': f"{file_name}.parquet", 'parents': [DRIVE_FOLDER_ID]}
-            service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-            print(f"      🆕 [New] {file_name} bóc tem thành công ({len(df)} dòng).")
-    except Exception as e:
-        print(f"      🔥 [LỖI] Toang khi upload {file_name}: {e}")
+    """Đẩy hàng nóng lên mây, kiểu cột theo DATASET_SCHEMAS bên drive_io."""
+    return upload_parquet(service, DRIVE_CATALOG, file_name, df, file_id)
 
 # ==============================================================================
 # 3. BỘ ĐÔI SCRAPER: THỢ CÀO HỘI THOẠI & THỢ CÀO CALL
@@ -91,16 +57,23 @@ def upload_to_drive(service, file_name, df, file_id=None):
 
 # --- A. SCRAPER CHO HỘI THOẠI (Miss Hội Thoại, Miss Zalo) ---
 def scrape_convo_data(driver, url, type_label):
-    driver.get(url)
-    time.sleep(8) # Chờ load hơi lâu tí cho chắc cốp
-    scraped_data = []
-    total_items = 0
-    
-    try:
-        pagination_text_el = driver.find_element(By.XPATH, "//*[contains(text(), 'trong tổng số')]")
-        match = re.search(r"tổng số\s+(\d+)", pagination_text_el.text)
-        if match: total_items = int(match.group(1))
-    except: pass
+    # Chế độ network: đọc thẳng JSON API của trang, ra item y hệt bản cào DOM
+    def to_item(f):
+        if not f["customer"]: return None
+        return {
+            "Loại": type_label,
+            "Khách hàng": f["customer"],
+            "Tags": f["tags"],
+            "Channel_Code": f["channel"] or "N/A",
+            "Thời gian": f["created"]
+        }
+    return scrape_with_network(driver, url, "convo", type_label, to_item,
+                               lambda: scrape_convo_dom(driver, url, type_label))
+
+def scrape_convo_dom(driver, url, type_label):
+    # Chờ tới khi trang hiện tổng số dòng (thay cho sleep cố định)
+    total_items = open_report(driver, url, "convo")
+    scraped_data = RowDeduper(type_label, "convo") # Chống trùng bằng khóa hash, khỏi quét list
 
     if total_items == 0: return []
 
@@ -108,28 +81,27 @@ def scrape_convo_data(driver, url, type_label):
         try:
             scroll = driver.find_element(By.CSS_SELECTOR, ".scroll-table-wrapper")
             driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", scroll)
-            time.sleep(1.5)
+            wait_rows_stable(driver, "convo")
             
-            rows = driver.find_elements(By.CSS_SELECTOR, "table.scroll-table tbody tr")
-            if not rows: rows = driver.find_elements(By.CSS_SELECTOR, "table.scroll-table tr")
+            # Cả trang về 1 lượt bằng JS, Python chỉ nhặt field
+            rows = extract_rows(driver)
             
             for row in rows:
                 try:
                     # Lấy tên khách
-                    user = row.find_element(By.CSS_SELECTOR, "span.ml-3").text.strip()
+                    user = row["user"]
                     if not user: continue
                     
                     # Lấy tags
-                    tags = ", ".join([t.text.strip() for t in row.find_elements(By.CSS_SELECTOR, ".convo_tag__title")])
+                    tags = ", ".join(row["tags"])
                     
                     # Lấy kênh (Channel) - Cột icon thường nằm ở td số 2 hoặc 3, check đại
-                    try: 
-                        cols = row.find_elements(By.TAG_NAME, "td")
-                        channel_icon = cols[1].find_element(By.TAG_NAME, "i").get_attribute("class")
-                    except: channel_icon = "N/A"
+                    cols = row["cells"]
+                    channel_icon = cols[1]["icon"] if len(cols) > 1 and cols[1]["icon"] is not None else "N/A"
 
                     # Thời gian
-                    created_time = row.find_element(By.XPATH, ".//td[last()]//span[@title]").get_attribute("title")
+                    created_time = row["last_title"]
+                    if created_time is None: continue
                     
                     item = {
                         "Loại": type_label,
@@ -138,31 +110,31 @@ def scrape_convo_data(driver, url, type_label):
                         "Channel_Code": channel_icon,
                         "Thời gian": created_time
                     }
-                    if item not in scraped_data: scraped_data.append(item)
+                    scraped_data.add(item)
                 except: continue
         except: break
 
         if len(scraped_data) >= total_items: break
-        try:
-            next_btn = driver.find_element(By.CSS_SELECTOR, ".lead-actions__paginate button:last-child")
-            if next_btn.get_attribute("disabled"): break 
-            driver.execute_script("arguments[0].click();", next_btn)
-            time.sleep(3)
-        except: break
-    return scraped_data
+        if not click_next_page(driver, "convo"): break
+    return scraped_data.finish()
 
 # --- B. SCRAPER CHO CUỘC GỌI (Miss Call) ---
 def scrape_call_missed(driver, url, type_label):
-    driver.get(url)
-    time.sleep(6)
-    scraped_data = []
-    total_items = 0
-    
-    try:
-        pagination_text_el = driver.find_element(By.XPATH, "//*[contains(text(), 'trong tổng số')]")
-        match = re.search(r"tổng số\s+(\d+)", pagination_text_el.text)
-        if match: total_items = int(match.group(1))
-    except: pass
+    # Chế độ network: đọc thẳng JSON API của trang, ra item y hệt bản cào DOM
+    def to_item(f):
+        return {
+            "SDT": f["phone"] or "N/A",
+            "Trạng thái": f["status"] or "N/A",
+            "Thời gian tạo": f["created"],
+            "Loại báo cáo": type_label
+        }
+    return scrape_with_network(driver, url, "call", type_label, to_item,
+                               lambda: scrape_call_missed_dom(driver, url, type_label))
+
+def scrape_call_missed_dom(driver, url, type_label):
+    # Chờ tới khi trang hiện tổng số dòng (thay cho sleep cố định)
+    total_items = open_report(driver, url, "call")
+    scraped_data = RowDeduper(type_label, "call") # Chống trùng bằng khóa hash, khỏi quét list
 
     if total_items == 0: return []
 
@@ -170,32 +142,28 @@ def scrape_call_missed(driver, url, type_label):
         try:
             scroll = driver.find_element(By.CSS_SELECTOR, ".scroll-table-wrapper")
             driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", scroll)
-            time.sleep(1.5)
+            wait_rows_stable(driver, "call")
             
-            rows = driver.find_elements(By.CSS_SELECTOR, "table.scroll-table tbody tr")
-            if not rows: rows = driver.find_elements(By.CSS_SELECTOR, "table.scroll-table tr")
+            # Cả trang về 1 lượt bằng JS, Python chỉ nhặt field
+            rows = extract_rows(driver)
             
             for row in rows:
                 try:
-                    cols = row.find_elements(By.TAG_NAME, "td")
+                    cols = row["cells"]
                     if len(cols) < 5: continue 
 
                     # 1. SĐT
-                    try: sdt = cols[1].text.strip()
-                    except: sdt = "N/A"
+                    sdt = cols[1]["text"]
 
                     # 2. Trạng thái (thường là Missed Call)
-                    try: trang_thai = cols[2].text.strip()
-                    except: trang_thai = "N/A"
+                    trang_thai = cols[2]["text"]
 
                     # 3. Thời gian tạo
-                    try:
-                        time_span = cols[7].find_element(By.TAG_NAME, "span")
-                        created_time = time_span.get_attribute("title")
-                    except: 
+                    if len(cols) > 7 and cols[7]["span"] is not None:
+                        created_time = cols[7]["span"]
+                    else:
                         # Fallback nếu cột lệch
-                        try: created_time = row.find_element(By.XPATH, ".//td[last()]//span[@title]").get_attribute("title")
-                        except: created_time = "N/A"
+                        created_time = row["last_title"] if row["last_title"] is not None else "N/A"
 
                     item = {
                         "SDT": sdt,
@@ -203,55 +171,39 @@ def scrape_call_missed(driver, url, type_label):
                         "Thời gian tạo": created_time,
                         "Loại báo cáo": type_label
                     }
-                    if item not in scraped_data: scraped_data.append(item)
+                    scraped_data.add(item)
                 except: continue
         except: break
 
         if len(scraped_data) >= total_items: break
-        try:
-            next_btn = driver.find_element(By.CSS_SELECTOR, ".lead-actions__paginate button:last-child")
-            if next_btn.get_attribute("disabled"): break 
-            driver.execute_script("arguments[0].click();", next_btn)
-            time.sleep(3)
-        except: break
-    return scraped_data
+        if not click_next_page(driver, "call"): break
+    return scraped_data.finish()
 
 # ==============================================================================
 # 4. LOGIC CHECK NGÀY MỚI (FAST & FURIOUS)
 # ==============================================================================
-def get_global_start_date(service):
+def get_start_dates(service):
     """
-    Check 1 file đại diện (Miss_Hoi_Thoai), thấy ngày nào thì chốt luôn.
+    Đọc sổ watermark trên Drive (vài chục byte) thay vì tải cả file tìm max(Ngay_Cào).
+    Mỗi loại cào tiếp từ đúng mốc của nó, loại này xong ngày X không kéo loại khác nhảy qua X.
+    Trả về {loại: ngày cần cào tiếp}.
     """
     default_date = datetime.date(2026, 1, 1)
-    print("\n🔍 Đệ đang check nhanh Drive...")
-
-    # Check thử file đầu tiên trong list
-    check_key = list(DATA_CONFIG.keys())[0] # "Miss_Hoi_Thoai"
-    print(f"   👀 Ngó qua file: {check_key}...", end=" ")
-    
-    df, _ = download_file_by_name(service, check_key)
-    
-    if not df.empty and 'Ngay_Cào' in df.columns:
-        try:
-            dates = pd.to_datetime(df['Ngay_Cào'], format="%Y-%m-%d", errors='coerce').dt.date
-            dates = dates.dropna()
-            
-            if not dates.empty:
-                local_max = dates.max()
-                print(f"✅ Thấy ngày Max: {local_max}")
-                start_date = local_max + datetime.timedelta(days=1)
-                print(f"🎯 => CHỐT HẠ: Cày tiếp từ ngày: {start_date}\n")
-                return start_date
-            else:
-                print("❌ File có nhưng lỗi ngày.")
-        except:
-            print("❌ Lỗi format ngày.")
-    else:
-        print("❌ Chưa có file nào cả.")
+    print("\n🔍 Đang soi sổ watermark trên Drive...")
+
+    marks = WATERMARKS.load(service, list(DATA_CONFIG.keys()))
+    starts = {}
+    for dtype, mark in marks.items():
+        if mark:
+            starts[dtype] = datetime.date.fromisoformat(mark) + datetime.timedelta(days=1)
+            print(f"   ✅ {dtype}: xong đến {mark}")
+        else:
+            starts[dtype] = default_date
+            print(f"   ⚠️ {dtype}: chưa có gì, cày từ đầu {default_date}")
 
-    print(f"⚠️ => Drive sạch bong, bắt đầu cày từ đầu: {default_date}\n")
-    return default_date
+    start_date = min(starts.values())
+    print(f"🎯 => CHỐT HẠ: Bắt đầu cày từ: {start_date}\n")
+    return starts
 
 # ==============================================================================
 # 5. MAIN PROGRAM
@@ -261,7 +213,8 @@ def main():
     service = get_drive_service()
     
     # 1. Check ngày
-    curr_date = get_global_start_date(service)
+    starts = get_start_dates(service)
+    curr_date = min(starts.values())
     yesterday = datetime.date.today() - datetime.timedelta(days=1)
     
     if curr_date > yesterday:
@@ -269,10 +222,10 @@ def main():
         return
 
     # 2. Bật Chrome
-    options = Options()
-    options.add_experimental_option("debuggerAddress", "127.0.0.1:9222")
+    pool = ScrapePool()
+    journal = ScrapeJournal(SCRAPER_NAME)
     try:
-        driver = webdriver.Chrome(options=options)
+        pool.start()
     except:
         print("🔥 Lỗi: Đại ca nhớ bật Chrome Debugger port 9222 nhé!")
         return
@@ -289,45 +242,61 @@ def main():
         
         daily_storage = {k: [] for k in DATA_CONFIG.keys()}
 
-        # --- XỬ LÝ TỪNG LOẠI URL ---
+        # --- XỬ LÝ TỪNG LOẠI URL (3 JOB, NHIỀU TAB THÌ CHẠY SONG SONG) ---
         
         # 1. MISS HỘI THOẠI
-        print("   🔍 Quét Miss Hội Thoại...")
         url_hoi_thoai = f"https://app.subiz.com.vn/new-reports/convo-list?conditions=%5B%7B%22key%22%3A%22created_time%22,%22value%22%3A%22%5B{t_range}%5D%22%7D,%7B%22key%22%3A%22channel%22,%22value%22%3A%22%5B%5C%22email%5C%22,%5C%22subiz%5C%22,%5C%22facebook%5C%22,%5C%22facebook_comment%5C%22,%5C%22instagram%5C%22,%5C%22instagram_comment%5C%22,%5C%22form%5C%22,%5C%22google_review%5C%22%5D%22%7D,%7B%22key%22%3A%22agent_sent%22,%22value%22%3A%22%5B%5C%22no%5C%22%5D%22%7D,%7B%22key%22%3A%22tags%22,%22value%22%3A%22%5B%5C%22yes%5C%22,%5C%22tgrzpqjrknqhxliqelct%5C%22%5D%22%7D%5D"
-        items_ht = scrape_convo_data(driver, url_hoi_thoai, "Miss_Hoi_Thoai")
-        if items_ht: 
-            for x in items_ht: x["Ngay_Cào"] = day_str
-            daily_storage["Miss_Hoi_Thoai"].extend(items_ht)
 
         # 2. MISS ZALO
-        print("   🔍 Quét Miss Zalo...")
         url_zalo = f"https://app.subiz.com.vn/new-reports/convo-list?conditions=%5B%7B%22key%22%3A%22created_time%22,%22value%22%3A%22%5B{t_range}%5D%22%7D,%7B%22key%22%3A%22channel%22,%22value%22%3A%22%5B%5C%22zalo_personal%5C%22,%5C%22zalo%5C%22%5D%22%7D,%7B%22key%22%3A%22agent_sent%22,%22value%22%3A%22%5B%5C%22no%5C%22%5D%22%7D,%7B%22key%22%3A%22tags%22,%22value%22%3A%22%5B%5C%22yes%5C%22,%5C%22tgrzpqjrknqhxliqelct%5C%22%5D%22%7D%5D"
-        items_zl = scrape_convo_data(driver, url_zalo, "Miss_Zalo")
-        if items_zl:
-            for x in items_zl: x["Ngay_Cào"] = day_str
-            daily_storage["Miss_Zalo"].extend(items_zl)
 
         # 3. MISS CALL
-        print("   🔍 Quét Miss Call...")
         url_call = f"https://app.subiz.com.vn/new-reports/call-list?conditions=%5B%7B%22key%22%3A%22created_time%22%2C%22value%22%3A%22%5B{t_range}%5D%22%7D%2C%7B%22key%22%3A%22missed_call%22%7D%5D"
-        items_call = scrape_call_missed(driver, url_call, "Miss_Call")
-        if items_call:
-            for x in items_call: x["Ngay_Cào"] = day_str
-            daily_storage["Miss_Call"].extend(items_call)
+
+        jobs = [
+            ("Miss_Hoi_Thoai", "Miss Hội Thoại", lambda driver: scrape_convo_data(driver, url_hoi_thoai, "Miss_Hoi_Thoai")),
+            ("Miss_Zalo", "Miss Zalo", lambda driver: scrape_convo_data(driver, url_zalo, "Miss_Zalo")),
+            ("Miss_Call", "Miss Call", lambda driver: scrape_call_missed(driver, url_call, "Miss_Call")),
+        ]
+        # Loại nào mốc riêng đã qua ngày này thì khỏi cào lại
+        jobs = [job for job in jobs if curr_date >= starts[job[0]]]
+        failed = pool.run(jobs, daily_storage, journal, day_str)
+        if failed:
+            # Không upload ngày thiếu job; job xong đã nằm trong sổ, chạy lại là cào tiếp đúng chỗ dở
+            print(f"🔥 {len(failed)} job lỗi ở ngày {day_str} ({', '.join(failed)}). Dừng ở đây, chạy lại sẽ cào tiếp!")
+            break
+        for xs in daily_storage.values():
+            for x in xs: x["Ngay_Cào"] = day_str
 
         # --- SAVE TO DRIVE ---
         print(f"\n📦 [GOM HÀNG] Xong ngày {day_str}. Đẩy lên Drive...")
+        uploaded = True
         for key in DATA_CONFIG.keys():
             if daily_storage[key]:
-                df_old, f_id = download_file_by_name(service, key)
-                new_df = pd.DataFrame(daily_storage[key])
-                final_df = pd.concat([df_old, new_df], ignore_index=True)
-                upload_to_drive(service, key, final_df, f_id)
+                # Mỗi loại 1 file partition cho ngày này, cào lại thì ghi đè đúng file đó
+                part = partition_name(key, day_str)
+                meta = DRIVE_CATALOG.find(service, f"{part}.parquet")
+                if not upload_to_drive(service, part, pd.DataFrame(daily_storage[key]), meta['id'] if meta else None):
+                    uploaded = False
             else:
                 pass # Không có data thì im lặng là vàng
 
+        if not uploaded:
+            # Upload hỏng thì dừng, không nhích mốc -> lần sau cào lại đúng ngày này (job đã cào vẫn nằm trong sổ)
+            print(f"🔥 Upload ngày {day_str} chưa trọn vẹn, dừng ở đây. Chạy lại sẽ đẩy tiếp!")
+            break
+        # Lên Drive đủ rồi thì nhích mốc watermark + gạch ngày này khỏi sổ checkpoint
+        WATERMARKS.advance(service, list(DATA_CONFIG.keys()), day_str)
+        journal.finish_day(day_str)
+
         curr_date += datetime.timedelta(days=1)
 
+    # --- DỌN KHO: GỘP PARTITION NGÀY CỦA CÁC THÁNG ĐÃ QUA THÀNH FILE THÁNG ---
+    for key in DATA_CONFIG.keys():
+        compact_partitions(service, DRIVE_CATALOG, key, upload_to_drive)
+
+    pool.close()
+    print_scrape_stats()
     print("\n💎 MISSION COMPLETED! Đại ca đẹp trai vô đối!")
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+import os
+import hmac
+import gzip
+import time
+import threading
+import functools
+from collections import OrderedDict
+from flask import request, Response
+
+# ==============================================================================
+# API CACHE - NHỚ SẴN KẾT QUẢ API THEO (API, KHOẢNG NGÀY, PHIÊN BẢN DATA)
+# ==============================================================================
+# Bấm "Lọc Dữ Liệu" lại đúng khoảng ngày cũ, hay dashboard tự gọi lúc mở trang,
+# thì trả luôn bản JSON đã nén gzip sẵn trong RAM, khỏi tính lại từ đầu.
+# load_all_data nạp data mới xong gọi bump() -> phiên bản đổi -> cache cũ tự vô hiệu.
+
+RESPONSE_CACHE_SIZE = 256   # Số response giữ tối đa (LRU)
+RESPONSE_CACHE_TTL = 1800   # Giây, quá hạn thì tính lại cho chắc
+GZIP_LEVEL = 6
+
+# Token cho /api/admin/reload (launcher gửi header X-Reload-Token). Để trống = khóa luôn route admin
+API_RELOAD_TOKEN = os.environ.get("API_RELOAD_TOKEN", "")
+
+
+class ResponseCache:
+    """LRU + TTL cho response JSON của Flask, lưu sẵn dạng gzip."""
+
+    def __init__(self, max_items=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.version = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def bump(self):
+        """Data vừa được thay -> tăng phiên bản, dọn sạch cache cũ cho nhẹ RAM."""
+        with self._lock:
+            self.version += 1
+            self._items.clear()
+        return self.version
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                if item is not None: del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, body_gz, mimetype):
+        with self._lock:
+            if key[-1] != self.version: return  # Data đổi giữa lúc đang tính -> bỏ, không lưu bản lai
+            self._items[key] = (time.monotonic(), (body_gz, mimetype))
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    @staticmethod
+    def _respond(body_gz, mimetype):
+        # Trình duyệt nào nhận gzip thì gửi nguyên bản nén, không thì giải nén ra
+        if 'gzip' in request.headers.get('Accept-Encoding', '').lower():
+            resp = Response(body_gz, mimetype=mimetype)
+            resp.headers['Content-Encoding'] = 'gzip'
+        else:
+            resp = Response(gzip.decompress(body_gz), mimetype=mimetype)
+        resp.headers['Vary'] = 'Accept-Encoding'
+        return resp
+
+    def cached(self, view):
+        """Decorator cho view Flask đọc ?start=&end=. Chỉ nhớ response 200, lỗi thì thôi."""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (view.__name__, request.args.get('start'), request.args.get('end'), self.version)
+            item = self.get(key)
+            if item is not None:
+                print(f"⚡ [Cache] {view.__name__} {key[1]} -> {key[2]} (hit {self.hits}, miss {self.misses})")
+                return self._respond(*item)
+
+            resp = view(*args, **kwargs)
+            if isinstance(resp, Response) and resp.status_code == 200 and not resp.direct_passthrough:
+                self.put(key, gzip.compress(resp.get_data(), GZIP_LEVEL), resp.mimetype)
+            return resp
+        return wrapper
+
+
+def admin_allowed():
+    """Request hiện tại có đúng token admin không (header X-Reload-Token hoặc ?token=)."""
+    if not API_RELOAD_TOKEN: return False
+    token = request.headers.get('X-Reload-Token') or request.args.get('token', '')
+    return hmac.compare_digest(token.encode('utf-8'), API_RELOAD_TOKEN.encode('utf-8'))
@@ -0,0 +1,69 @@
+import os
+import sys
+import pyarrow.parquet as pq
+from googleapiclient.discovery import build
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.transport.requests import Request
+from drive_io import (DATASET_SCHEMAS, get_catalog, download_to_cache, read_cached_parquet, dataset_files,
+                      schema_matches, upload_parquet)
+
+# ==============================================================================
+# 1. CẤU HÌNH - CHẠY 1 LẦN: GHI LẠI PARQUET CŨ TRÊN DRIVE THEO SCHEMA CHUNG
+# ==============================================================================
+# File mới do 1.py / 2.py / 3.py ghi đã đúng schema (giờ là timestamp, nhãn là dictionary,
+# Call có Duration_Sec int32). Script này lo phần lịch sử: file gốc + partition tháng/ngày
+# còn kiểu chuỗi thì ghi đè đúng id cũ, server đang chạy thấy md5 đổi là tự nạp lại.
+# Chạy thử không đẩy gì:  python backfill_schema.py --dry-run
+DRIVE_FOLDER_ID = "1056rTo3LQ9vGhjUAJMEZLUCG98DJedRC"
+DRIVE_CATALOG = get_catalog(DRIVE_FOLDER_ID)
+DATA_TYPES = list(DATASET_SCHEMAS)
+SCOPES = ['https://www.googleapis.com/auth/drive']
+DRY_RUN = "--dry-run" in sys.argv
+
+# ==============================================================================
+# 2. HÀM KẾT NỐI DRIVE
+# ==============================================================================
+def get_drive_service():
+    creds = None
+    if os.path.exists('token.json'):
+        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
+            creds = flow.run_local_server(port=0)
+        with open('token.json', 'w') as token:
+            token.write(creds.to_json())
+    return build('drive', 'v3', credentials=creds)
+
+# ==============================================================================
+# 3. MAIN BACKFILL
+# ==============================================================================
+def main():
+    print(f"🧱 --- GHI LẠI PARQUET CŨ THEO SCHEMA CHUNG {'(CHẠY THỬ) ' if DRY_RUN else ''}---")
+    service = get_drive_service()
+    done = skipped = failed = 0
+
+    for dtype in DATA_TYPES:
+        print(f"\n📂 {dtype}")
+        for meta in dataset_files(service, DRIVE_CATALOG, dtype):
+            # Tải cả file về cache (đã có bản mới nhất thì thôi), soi schema ở footer:
+            # đúng rồi thì khỏi đọc dữ liệu vào RAM, khỏi ghi lại
+            path, _ = download_to_cache(service, meta)
+            if schema_matches(dtype, pq.read_schema(path)):
+                skipped += 1
+                continue
+
+            df, _ = read_cached_parquet(service, meta)
+            print(f"   🔧 {meta['name']}: {len(df)} dòng")
+            if DRY_RUN: continue
+            file_name = meta['name'][:-len(".parquet")]
+            if upload_parquet(service, DRIVE_CATALOG, file_name, df, meta['id']): done += 1
+            else: failed += 1
+
+    print(f"\n✅ Xong: ghi lại {done} file, {skipped} file đã đúng schema, {failed} file lỗi (chạy lại là làm tiếp).")
+
+if __name__ == "__main__":
+    main()
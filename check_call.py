@@ -1,16 +1,16 @@
 import pandas as pd
-import io
 import os
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from drive_io import get_catalog, read_dataset, DURATION_COLUMN, add_duration_seconds
 
 # ==============================================================================
 # 1. CẤU HÌNH
 # ==============================================================================
 DRIVE_FOLDER_ID = "1056rTo3LQ9vGhjUAJMEZLUCG98DJedRC"
+DRIVE_CATALOG = get_catalog(DRIVE_FOLDER_ID)
 DATA_TYPES = [
     "Call_Den_Trong_Gio", 
     "Call_Di_Trong_Gio", 
@@ -48,23 +48,13 @@ def download_file_by_name(service, file_name):
     # Đã sửa lỗi dòng in ở đây
     print(f"⬇️ Đang tải file: {file_name}...", end="\r")
     
-    query = f"name = '{file_name}.parquet' and '{DRIVE_FOLDER_ID}' in parents and trashed = false"
-    results = service.files().list(q=query, fields="files(id)").execute()
-    files = results.get('files', [])
+    # File gốc + partition tháng/ngày (cache local, Drive chưa đổi thì khỏi tải)
+    df, _ = read_dataset(service, DRIVE_CATALOG, file_name)
     
-    if files:
-        file_id = files[0]['id']
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
-        fh.seek(0)
-        
+    if df is not None:
         # Đã sửa lỗi dòng in ở đây (thêm đóng ngoặc kép cẩn thận)
         print(f"✅ Đã tải xong: {file_name}      ")
-        return pd.read_parquet(fh)
+        return df
     
     print(f"❌ Không tìm thấy file: {file_name}")
     return pd.DataFrame()
@@ -92,7 +82,8 @@ def main():
             continue
 
         # Lọc lấy dữ liệu ngày chỉ định
-        df_target = df[df['Ngay_Cào'] == TARGET_DATE]
+        # Ngay_Cào file mới là timestamp, file cũ là chuỗi -> so theo 10 ký tự đầu cho cả 2 kiểu
+        df_target = df[df['Ngay_Cào'].astype(str).str[:10] == TARGET_DATE]
         count = len(df_target)
 
         print(f"📊 Tổng số dòng tìm thấy trong ngày {TARGET_DATE}: {count} dòng")
@@ -102,10 +93,9 @@ def main():
             # In ra 20 dòng đầu tiên của ngày hôm đó
             print(df_target.head(20).to_string(index=False))
             
-            # Kiểm tra nhanh xem có dòng nào 0 phút không
-            trash_df = df_target[
-                df_target['Thời lượng'].astype(str).str.match(r'^(0\s|00:|0$)', case=False)
-            ]
+            # Kiểm tra nhanh xem có dòng nào 0 phút không (cùng 1 bộ parse với server, file cũ chưa có cột thì parse bù)
+            df_target = add_duration_seconds(df_target.copy())
+            trash_df = df_target[df_target[DURATION_COLUMN] == 0]
             if not trash_df.empty:
                  print(f"\n⚠️ CẢNH BÁO: Phát hiện {len(trash_df)} dòng có thời lượng = 0!")
         else:
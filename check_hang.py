@@ -1,17 +1,17 @@
 import pandas as pd
-import io
 import os
 import sys
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from drive_io import get_catalog, read_dataset
 
 # ==============================================================================
 # 1. CẤU HÌNH (ĐỪNG CHỈNH SỬA GÌ Ở ĐÂY NẾU KHÔNG MUỐN TOANG)
 # ==============================================================================
 DRIVE_FOLDER_ID = "1056rTo3LQ9vGhjUAJMEZLUCG98DJedRC"
+DRIVE_CATALOG = get_catalog(DRIVE_FOLDER_ID)
 
 # Danh sách 8 loại file đại ca yêu cầu
 DATA_TYPES = [
@@ -50,26 +50,15 @@ def get_drive_service():
 def download_file_content(service, file_name):
     """Móc lốp file từ Drive về RAM"""
     print(f"   ⏳ Đang kéo file: {file_name}...", end="\r")
-    query = f"name = '{file_name}.parquet' and '{DRIVE_FOLDER_ID}' in parents and trashed = false"
-    results = service.files().list(q=query, fields="files(id)").execute()
-    files = results.get('files', [])
-
-    if files:
-        file_id = files[0]['id']
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
-        fh.seek(0)
-        try:
-            df = pd.read_parquet(fh)
+    # File gốc + partition tháng/ngày (cache local, Drive chưa đổi thì khỏi tải)
+    try:
+        df, _ = read_dataset(service, DRIVE_CATALOG, file_name)
+        if df is not None:
             # Thêm cột loại để tí nữa phân biệt
             df['Loại_Dữ_Liệu'] = file_name 
             return df
-        except:
-            return pd.DataFrame()
+    except:
+        return pd.DataFrame()
     return pd.DataFrame()
 
 # ==============================================================================
@@ -91,7 +80,9 @@ def main():
             # Chỉ lấy các cột cần thiết để tính toán cho nhẹ
             if 'Ngay_Cào' in df.columns and 'Nhân viên hệ thống' in df.columns:
                 # Group trước cho nhẹ RAM: Đếm số dòng theo Ngày & Nhân Viên
-                grouped = df.groupby(['Ngay_Cào', 'Nhân viên hệ thống']).size().reset_index(name='So_Luong')
+                # Ngày về chuỗi 'YYYY-MM-DD' (file mới là timestamp, file cũ là chuỗi); nhân viên là category thì chỉ đếm cặp có thật
+                day = df['Ngay_Cào'].astype(str).str[:10]
+                grouped = df.groupby([day, 'Nhân viên hệ thống'], observed=True).size().reset_index(name='So_Luong')
                 grouped['Loại_Dữ_Liệu'] = dtype # Gán nhãn loại dữ liệu (ví dụ: Ticket_Trong_Gio)
                 all_data_frames.append(grouped)
             else:
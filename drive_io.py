@@ -0,0 +1,875 @@
+import io
+import os
+import re
+import json
+import time
+import datetime
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
+
+# ==============================================================================
+# DRIVE I/O - ĐỒ NGHỀ TẢI/ĐẨY FILE DÙNG CHUNG CHO SERVER & SCRAPER
+# ==============================================================================
+
+# Số luồng tải song song tối đa (Drive hay bóp nếu mở quá nhiều kết nối)
+DOWNLOAD_WORKERS = 6
+
+# Danh bạ file trong folder Drive sống bao lâu thì list lại (giây)
+CATALOG_TTL = 300
+FILE_FIELDS = "id, name, modifiedTime, md5Checksum, size"
+CATALOG_FIELDS = f"nextPageToken, files({FILE_FIELDS})"
+
+# Thư mục cache parquet trên máy (tương đối theo thư mục chạy, giống token.json)
+LOCAL_CACHE_DIR = "drive_cache"
+
+# Partition: mỗi loại dữ liệu mỗi ngày 1 file "<Loại>__YYYY-MM-DD.parquet",
+# tháng cũ được gộp lại thành "<Loại>__YYYY-MM.parquet".
+# Drive không có đường dẫn kiểu thư mục con nên nhét luôn vào tên file,
+# vẫn nằm chung folder -> 1 lần list danh bạ là thấy hết.
+PARTITION_SEP = "__"
+DAY_KEY = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+MONTH_KEY = re.compile(r"^\d{4}-\d{2}$")
+
+# Số mảnh (partition / tháng của file gốc) giữ sẵn trong RAM cho API đọc theo khoảng ngày
+PARTITION_LRU_SIZE = 64
+
+# Cột chuỗi chỉ lặp lại vài chục giá trị -> category (mã số + bảng tra), RAM giảm mấy lần, lọc == / groupby nhanh hơn
+CATEGORY_COLUMNS = ("Tags", "Nhân viên hệ thống", "Agent Subiz", "Loại", "Trạng thái")
+
+# Thời lượng cuộc gọi: chữ ('3 phút 20 giây', 'mm:ss', 'h:mm:ss') parse 1 lần lúc ghi ra số giây int32
+DURATION_TEXT = "Thời lượng"
+DURATION_COLUMN = "Duration_Sec"
+DURATION_UNITS = {"giờ": 3600, "phút": 60, "giây": 1}
+DURATION_PART = re.compile(r"(\d+)\s*(giờ|phút|giây)")
+
+# Sổ mốc ngày đã cào xong của mỗi scraper: "_watermark__<tên>.json" nằm chung folder với data
+WATERMARK_PREFIX = "_watermark__"
+
+# Server tự hỏi Drive xem có file mới không sau mỗi bấy nhiêu giây (0 = tắt, chỉ reload bằng tay)
+REFRESH_INTERVAL = int(os.environ.get("REFRESH_INTERVAL", "300"))
+
+# ==============================================================================
+# 1. DANH BẠ FILE (LIST FOLDER 1 LẦN, KHỎI HỎI DRIVE TỪNG FILE MỘT)
+# ==============================================================================
+class DriveCatalog:
+    """
+    Cache tên file -> {id, modifiedTime, md5Checksum, size} của 1 folder Drive.
+    List cả folder 1 phát, hết TTL thì list lại. Nhờ vậy mỗi lần tải file chỉ
+    còn đúng 1 request get_media thay vì list + get_media.
+    """
+
+    def __init__(self, folder_id, ttl=CATALOG_TTL):
+        self.folder_id = folder_id
+        self.ttl = ttl
+        self._files = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self, service):
+        """List lại toàn bộ folder (có phân trang)."""
+        query = f"'{self.folder_id}' in parents and trashed = false"
+        files = {}
+        page_token = None
+        while True:
+            resp = service.files().list(q=query, fields=CATALOG_FIELDS, pageSize=1000, pageToken=page_token).execute()
+            for f in resp.get('files', []):
+                # Trùng tên thì giữ thằng đầu tiên như logic files[0] cũ
+                files.setdefault(f['name'], f)
+            page_token = resp.get('nextPageToken')
+            if not page_token: break
+        with self._lock:
+            self._files = files
+            self._loaded_at = time.monotonic()
+        return files
+
+    def is_stale(self):
+        return self._loaded_at is None or (time.monotonic() - self._loaded_at) > self.ttl
+
+    def find(self, service, file_name):
+        """Tra metadata theo tên file (vd 'Miss_Call.parquet'), không có thì trả None."""
+        if self.is_stale():
+            # Nhiều luồng cùng thấy hết hạn thì chỉ 1 thằng đi list, mấy thằng kia chờ
+            with self._refresh_lock:
+                if self.is_stale():
+                    self.refresh(service)
+        with self._lock:
+            return self._files.get(file_name)
+
+    def remember(self, meta):
+        """Ghi nhận file vừa tạo/cập nhật để lần sau khỏi phải list lại."""
+        if not meta or 'name' not in meta: return
+        with self._lock:
+            self._files[meta['name']] = meta
+
+    def partitions(self, service, dtype):
+        """Liệt kê partition của 1 loại dữ liệu: [(key, meta)] sort theo key ('YYYY-MM' hoặc 'YYYY-MM-DD')."""
+        self.find(service, "")  # chỉ để refresh nếu hết hạn
+        prefix = f"{dtype}{PARTITION_SEP}"
+        parts = []
+        with self._lock:
+            for name, meta in self._files.items():
+                if not (name.startswith(prefix) and name.endswith(".parquet")): continue
+                key = name[len(prefix):-len(".parquet")]
+                if DAY_KEY.match(key) or MONTH_KEY.match(key):
+                    parts.append((key, meta))
+        return sorted(parts, key=lambda x: x[0])
+
+    def forget(self, file_name):
+        """Bỏ file vừa xóa khỏi danh bạ."""
+        with self._lock:
+            self._files.pop(file_name, None)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+_CATALOGS = {}
+_CATALOGS_LOCK = threading.Lock()
+
+def get_catalog(folder_id, ttl=CATALOG_TTL):
+    """Mỗi folder chỉ có 1 danh bạ dùng chung (kể cả khi ghép app 1_map + 2_map)."""
+    with _CATALOGS_LOCK:
+        if folder_id not in _CATALOGS:
+            _CATALOGS[folder_id] = DriveCatalog(folder_id, ttl)
+        return _CATALOGS[folder_id]
+
+# ==============================================================================
+# 2. CACHE PARQUET TRÊN Ổ CỨNG (CHỈ TẢI LẠI KHI DRIVE CÓ BẢN MỚI)
+# ==============================================================================
+def _same_version(local_meta, remote_meta):
+    """Ưu tiên so md5, file nào Drive không trả md5 thì so modifiedTime + size."""
+    if not local_meta: return False
+    if remote_meta.get('md5Checksum') and local_meta.get('md5Checksum'):
+        return remote_meta['md5Checksum'] == local_meta['md5Checksum']
+    return (remote_meta.get('modifiedTime') == local_meta.get('modifiedTime')
+            and remote_meta.get('size') == local_meta.get('size'))
+
+
+def download_to_cache(service, meta, cache_dir=LOCAL_CACHE_DIR):
+    """
+    Trả về (đường dẫn file local, có_dùng_cache_không).
+    Bản trên Drive chưa đổi (md5/modifiedTime y hệt) thì khỏi tải, dùng luôn file cũ.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, meta['name'])
+    meta_path = path + ".meta.json"
+
+    local_meta = None
+    if os.path.exists(path) and os.path.exists(meta_path):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                local_meta = json.load(f)
+        except Exception:
+            local_meta = None
+    if _same_version(local_meta, meta):
+        return path, True
+
+    # Tải ra file tạm rồi mới đổi tên -> đang tải dở mà chết thì cache cũ vẫn nguyên
+    tmp_path = f"{path}.{threading.get_ident()}.part"
+    try:
+        with open(tmp_path, 'wb') as fh:
+            downloader = MediaIoBaseDownload(fh, service.files().get_media(fileId=meta['id']))
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({k: meta.get(k) for k in ('id', 'name', 'modifiedTime', 'md5Checksum', 'size')}, f)
+    return path, False
+
+
+def read_cached_parquet(service, meta, columns=None):
+    """Tải (hoặc lấy cache) rồi đọc parquet bằng memory map. Trả về (DataFrame, có_dùng_cache_không)."""
+    path, from_cache = download_to_cache(service, meta)
+    if columns is not None:
+        # Cột nào file không có thì bỏ qua thay vì nổ lỗi
+        names = set(pq.read_schema(path).names)
+        columns = [c for c in columns if c in names]
+    return pd.read_parquet(path, engine='pyarrow', memory_map=True, columns=columns), from_cache
+
+# ==============================================================================
+# 3. PARTITION THEO NGÀY (GHI NỐI ĐUÔI, KHỎI TẢI CẢ LỊCH SỬ VỀ GỘP)
+# ==============================================================================
+def partition_name(dtype, key):
+    """Tên file partition (không kèm .parquet), vd partition_name('Miss_Call', '2026-01-05')."""
+    return f"{dtype}{PARTITION_SEP}{key}"
+
+
+def _partition_in_range(key, start, end):
+    """Partition ngày/tháng có dính khoảng [start, end] ('YYYY-MM-DD') không."""
+    if len(key) == 10:
+        first = last = key
+    else:
+        first, last = f"{key}-01", f"{key}-31"
+    if start and last < start: return False
+    if end and first > end: return False
+    return True
+
+
+def _day_strings(df):
+    return df['Ngay_Cào'].astype(str).str[:10]
+
+
+def read_dataset(service, catalog, dtype, start=None, end=None, columns=None):
+    """
+    Đọc 1 loại dữ liệu = file gốc kiểu cũ '<Loại>.parquet' (nếu còn) + các partition tháng/ngày.
+    Chỉ tải partition dính khoảng [start, end] (bỏ trống = lấy hết).
+    Ngày nào có ở lớp chi tiết hơn (ngày > tháng > file gốc) thì lớp đó thắng,
+    nên cào lại 1 ngày hay gộp tháng bị ngắt giữa chừng cũng không bị đếm trùng.
+    Trả về (DataFrame hoặc None nếu không có gì, {'files': số file, 'cached': số file lấy từ cache}).
+    """
+    layers = []  # (cấp, meta): 0 = file gốc, 1 = tháng, 2 = ngày
+    legacy = catalog.find(service, f"{dtype}.parquet")
+    if legacy: layers.append((0, legacy))
+    for key, meta in catalog.partitions(service, dtype):
+        if _partition_in_range(key, start, end):
+            layers.append((2 if len(key) == 10 else 1, meta))
+
+    info = {"files": len(layers), "cached": 0}
+    if not layers: return None, info
+
+    frames = []
+    for level, meta in layers:
+        df, from_cache = read_cached_parquet(service, meta, columns)
+        info["cached"] += int(from_cache)
+        frames.append((level, df))
+
+    return _merge_layers(frames), info
+
+
+def dataset_files(service, catalog, dtype):
+    """Metadata file gốc kiểu cũ (nếu còn) + mọi partition tháng/ngày của 1 loại."""
+    metas = [meta for _, meta in catalog.partitions(service, dtype)]
+    legacy = catalog.find(service, f"{dtype}.parquet")
+    if legacy: metas.insert(0, legacy)
+    return metas
+
+
+def cache_dataset(service, catalog, dtype):
+    """Kéo file gốc + mọi partition của 1 loại về cache ổ cứng (không đọc vào RAM). Trả về info như read_dataset."""
+    metas = dataset_files(service, catalog, dtype)
+    return {"files": len(metas), "cached": sum(int(download_to_cache(service, meta)[1]) for meta in metas)}
+
+
+def compact_frame(df, columns=CATEGORY_COLUMNS):
+    """Đổi mấy cột chuỗi ít giá trị sang category (sửa tại chỗ, trả về luôn df cho tiện gắn vào prepare)."""
+    for col in columns:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def duration_seconds(text):
+    """'3 phút 20 giây' / '50 giây' / 'mm:ss' / 'h:mm:ss' -> số giây (int). Không đọc được thì 0."""
+    if not isinstance(text, str): return 0
+    text = text.strip().lower()
+    if ":" in text:
+        try: parts = [int(p) for p in text.split(":")]
+        except ValueError: return 0
+        if len(parts) not in (2, 3): return 0
+        total = 0
+        for p in parts: total = total * 60 + p
+        return total
+    return sum(int(n) * DURATION_UNITS[unit] for n, unit in DURATION_PART.findall(text))
+
+
+def add_duration_seconds(df):
+    """
+    Gắn cột Duration_Sec (int32) từ cột 'Thời lượng' (sửa tại chỗ, trả về luôn df).
+    File đã có cột thì chỉ lấp mấy dòng trống (file cũ gộp chung file mới), mỗi chuỗi khác nhau parse 1 lần.
+    """
+    if DURATION_COLUMN in df.columns and df[DURATION_COLUMN].dtype == 'int32': return df
+    if DURATION_TEXT not in df.columns:
+        if DURATION_COLUMN in df.columns and df[DURATION_COLUMN].dtype != 'int32':
+            df[DURATION_COLUMN] = df[DURATION_COLUMN].fillna(0).astype('int32')
+        return df
+
+    if DURATION_COLUMN in df.columns:
+        seconds = df[DURATION_COLUMN].to_numpy(dtype=float, na_value=np.nan)
+        todo = np.isnan(seconds)
+    else:
+        seconds = np.zeros(len(df), dtype=float)
+        todo = np.ones(len(df), dtype=bool)
+
+    if todo.any():
+        codes, uniques = pd.factorize(df[DURATION_TEXT].to_numpy(dtype=object)[todo])
+        # Mã -1 (ô trống) rơi vào phần tử 0 gắn ở cuối
+        values = np.array([duration_seconds(u) for u in uniques] + [0], dtype=float)
+        seconds[todo] = values[codes]
+    df[DURATION_COLUMN] = seconds.astype('int32')
+    return df
+
+
+def frame_memory(df):
+    """RAM thật của DataFrame (tính cả chuỗi bên trong cột object)."""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def _concat(dfs):
+    """pd.concat giữ được kiểu category: mảnh nào category khác nhau thì gộp bảng tra trước, không thì rớt về object."""
+    dfs = list(dfs)
+    if len(dfs) > 1:
+        for col in dfs[0].columns:
+            if not all(col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for df in dfs): continue
+            if all(df[col].dtype == dfs[0][col].dtype for df in dfs): continue
+            cats = pd.Index([]).append([df[col].cat.categories for df in dfs]).unique()
+            dfs = [df.assign(**{col: df[col].cat.set_categories(cats)}) for df in dfs]
+    return pd.concat(dfs, ignore_index=True)
+
+
+def _merge_layers(frames):
+    """Gộp [(cấp, DataFrame)], ngày nào có ở cấp cao hơn thì bỏ dòng của ngày đó ở cấp thấp hơn."""
+    if len(frames) == 1: return frames[0][1]
+    if len({lv for lv, _ in frames}) == 1:
+        return _concat(df for _, df in frames)
+
+    covered = set()
+    kept = [None] * len(frames)
+    for level in (2, 1, 0):
+        level_days = set()
+        for i, (lv, df) in enumerate(frames):
+            if lv != level: continue
+            if 'Ngay_Cào' in df.columns:
+                days = _day_strings(df)
+                level_days.update(days.unique())
+                if covered: df = df[~days.isin(covered)]
+            kept[i] = df
+        covered |= level_days
+    return _concat(kept)
+
+
+def compact_partitions(service, catalog, dtype, upload_fn, today=None):
+    """
+    Gộp partition ngày của các tháng đã qua thành 1 file tháng rồi xóa file ngày.
+    upload_fn(service, file_name, df, file_id) là hàm upload của script, phải trả về
+    metadata khi thành công. Upload hỏng thì giữ nguyên file ngày, lần sau gộp lại.
+    """
+    this_month = (today or datetime.date.today()).strftime("%Y-%m")
+    parts = catalog.partitions(service, dtype)
+    month_files = {key: meta for key, meta in parts if len(key) == 7}
+    pending = {}
+    for key, meta in parts:
+        if len(key) == 10 and key[:7] < this_month:
+            pending.setdefault(key[:7], []).append((key, meta))
+
+    for month, days in sorted(pending.items()):
+        day_keys = {key for key, _ in days}
+        frames = []
+        if month in month_files:
+            old, _ = read_cached_parquet(service, month_files[month])
+            if 'Ngay_Cào' in old.columns:
+                old = old[~_day_strings(old).isin(day_keys)]
+            frames.append(old)
+        frames += [read_cached_parquet(service, meta)[0] for _, meta in days]
+        merged = pd.concat(frames, ignore_index=True)
+
+        file_id = month_files[month]['id'] if month in month_files else None
+        if not upload_fn(service, partition_name(dtype, month), merged, file_id):
+            print(f"   ⚠️ Gộp {dtype} tháng {month} thất bại, giữ nguyên file ngày.")
+            continue
+        for key, meta in days:
+            service.files().delete(fileId=meta['id']).execute()
+            catalog.forget(f"{partition_name(dtype, key)}.parquet")
+        print(f"   🗜️ Đã gộp {len(days)} ngày vào {partition_name(dtype, month)} ({len(merged)} dòng)")
+
+# ==============================================================================
+# 4. TẢI SONG SONG
+# ==============================================================================
+def parallel_download(file_names, download_fn, service_factory, max_workers=DOWNLOAD_WORKERS):
+    """
+    Tải cả lô file cùng lúc bằng thread pool, trả về ({tên: DataFrame}, {tên: số giây}).
+    Mỗi luồng tự build service riêng qua service_factory vì client HTTP của
+    googleapiclient (httplib2) không dùng chung giữa các luồng được.
+    """
+    local = threading.local()
+    factory_lock = threading.Lock()
+
+    def get_service():
+        if not hasattr(local, "service"):
+            # Khóa lại để các luồng không tranh nhau refresh/ghi token.json
+            with factory_lock:
+                local.service = service_factory()
+        return local.service
+
+    def job(name):
+        t0 = time.perf_counter()
+        df = download_fn(get_service(), name)
+        return name, df, time.perf_counter() - t0
+
+    results, timings = {}, {}
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(file_names) or 1)),
+                            thread_name_prefix="drive-dl") as pool:
+        futures = [pool.submit(job, name) for name in file_names]
+        for future in as_completed(futures):
+            name, df, seconds = future.result()
+            results[name] = df
+            timings[name] = seconds
+    wall = time.perf_counter() - t_start
+
+    print(f"   ⏱️ Tải {len(file_names)} file mất {wall:.1f}s (tổng nếu tải lần lượt: {sum(timings.values()):.1f}s)")
+    for name, seconds in sorted(timings.items(), key=lambda x: -x[1]):
+        print(f"      - {name}: {seconds:.2f}s")
+
+    # Trả về đúng thứ tự danh sách gốc cho dễ debug
+    return {name: results[name] for name in file_names}, timings
+
+# ==============================================================================
+# 5. ĐỌC THEO KHOẢNG NGÀY (CHỈ CHẠM PARTITION / ROW GROUP CẦN THIẾT) + LRU
+# ==============================================================================
+def _months_between(start, end):
+    """['YYYY-MM', ...] từ tháng của start tới tháng của end (start/end dạng 'YYYY-MM-DD')."""
+    y, m = int(start[:4]), int(start[5:7])
+    months = []
+    while f"{y:04d}-{m:02d}" <= end[:7]:
+        months.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+
+def _month_filter(field_type, month):
+    """Filter pyarrow lấy đúng 1 tháng theo Ngay_Cào (cột chuỗi 'YYYY-MM-DD' hoặc timestamp)."""
+    first = datetime.date(int(month[:4]), int(month[5:7]), 1)
+    nxt = (first + datetime.timedelta(days=32)).replace(day=1)
+    col = ds.field('Ngay_Cào')
+    if pa.types.is_string(field_type) or pa.types.is_large_string(field_type):
+        return (col >= first.isoformat()) & (col < nxt.isoformat())
+    if pa.types.is_timestamp(field_type) or pa.types.is_date(field_type):
+        lo, hi = pa.scalar(first).cast(field_type), pa.scalar(nxt).cast(field_type)
+        return (col >= lo) & (col < hi)
+    return None
+
+
+class PartitionStore:
+    """
+    Cho API đọc dữ liệu theo khoảng ngày mà không phải ôm cả lịch sử trong RAM.
+    - Partition ngày/tháng: chỉ đọc file nào dính khoảng ngày.
+    - File gốc kiểu cũ: đọc từng tháng bằng filter Ngay_Cào của pyarrow dataset
+      (row group nào nằm ngoài tháng thì bỏ qua nhờ thống kê min/max).
+    Mỗi mảnh đọc xong được chạy qua prepare() rồi giữ trong LRU; file trên Drive đổi
+    md5 thì khóa cache đổi theo nên không bao giờ dính bản cũ.
+    RAM trước/sau prepare của từng mảnh được ghi lại, memory_report() cộng cho mảnh đang nằm trong LRU.
+    Danh sách file được chụp lại lúc snapshot() (lúc load data), request không hỏi Drive.
+    """
+
+    def __init__(self, catalog, service_factory, prepare=None, max_items=PARTITION_LRU_SIZE):
+        self.catalog = catalog
+        self.service_factory = service_factory
+        self.prepare = prepare
+        self.max_items = max_items
+        self._layout = None
+        self._lru = OrderedDict()
+        self._mem = {}  # khóa LRU -> (RAM lúc mới đọc, RAM sau prepare)
+        self._by_month = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._layout is not None
+
+    @property
+    def layout(self):
+        """Layout đang phục vụ. Request giữ lấy 1 bản rồi đọc hết bằng nó, reload giữa chừng cũng không bị lẫn."""
+        return self._layout
+
+    def snapshot(self, service, dtypes):
+        """Chụp lại danh sách file gốc + partition của từng loại từ danh bạ."""
+        layout = {}
+        for dtype in dtypes:
+            layout[dtype] = (self.catalog.find(service, f"{dtype}.parquet"), self.catalog.partitions(service, dtype))
+        self._layout = layout
+        return layout
+
+    def _path(self, meta):
+        # File thường đã nằm sẵn trong cache ổ cứng từ lúc load, thiếu mới phải gọi Drive
+        path = os.path.join(LOCAL_CACHE_DIR, meta['name'])
+        if os.path.exists(path) and _same_version(self._local_meta(path), meta): return path
+        return download_to_cache(self.service_factory(), meta)[0]
+
+    @staticmethod
+    def _local_meta(path):
+        try:
+            with open(path + ".meta.json", 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def _load(self, meta, month=None):
+        """Đọc 1 mảnh (cả file partition, hoặc 1 tháng của file gốc), có LRU."""
+        key = (meta['name'], meta.get('md5Checksum') or meta.get('modifiedTime'), month)
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return self._lru[key]
+
+        path = self._path(meta)
+        if month is None:
+            table = pq.read_table(path, memory_map=True)
+        else:
+            dataset = ds.dataset(path, format='parquet')
+            field = dataset.schema.field('Ngay_Cào').type
+            table = dataset.to_table(filter=_month_filter(field, month))
+        df = table.to_pandas()
+        raw_bytes = frame_memory(df)
+        if self.prepare: df = self.prepare(df)
+        mem = (raw_bytes, frame_memory(df))
+
+        with self._lock:
+            self._lru[key] = df
+            self._mem[key] = mem
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_items:
+                old, _ = self._lru.popitem(last=False)
+                self._mem.pop(old, None)
+        label = meta['name'] if month is None else f"{meta['name']} tháng {month}"
+        print(f"   🗜️ [Kho] {label}: {mem[0] / 2**20:.1f} MB -> {mem[1] / 2**20:.1f} MB | {self.memory_report()}")
+        return df
+
+    def memory_report(self):
+        """Tổng RAM các mảnh đang giữ: trước và sau khi prepare (category + datetime64)."""
+        with self._lock:
+            raw = sum(r for r, _ in self._mem.values())
+            now = sum(c for _, c in self._mem.values())
+            count = len(self._mem)
+        ratio = f" (giảm {raw / now:.1f} lần)" if now else ""
+        return f"{count} mảnh, {raw / 2**20:.1f} MB -> {now / 2**20:.1f} MB{ratio}"
+
+    def _month_slices(self, meta):
+        """File gốc có cột Ngay_Cào lọc được theo tháng không (đọc footer 1 lần mỗi phiên bản file)."""
+        key = (meta['name'], meta.get('md5Checksum') or meta.get('modifiedTime'))
+        if key not in self._by_month:
+            schema = pq.read_schema(self._path(meta))
+            self._by_month[key] = ('Ngay_Cào' in schema.names and
+                                   _month_filter(schema.field('Ngay_Cào').type, "2026-01") is not None)
+        return self._by_month[key]
+
+    def _empty(self, meta):
+        """Khoảng ngày không dính file nào: trả bảng rỗng nhưng đủ cột như bình thường."""
+        df = pq.read_schema(self._path(meta)).empty_table().to_pandas()
+        return self.prepare(df) if self.prepare else df
+
+    def read(self, dtype, start, end, layout=None):
+        """
+        Dữ liệu của 1 loại có Ngay_Cào rơi vào [start, end] (Timestamp/date/'YYYY-MM-DD').
+        Chỉ lọc thô theo tháng/partition, người gọi vẫn tự filter_by_date cho chính xác.
+        Không có file nào thì trả DataFrame rỗng như hồi tải cả file.
+        """
+        layout = layout or self._layout
+        if layout is None or dtype not in layout: return pd.DataFrame()
+        legacy, parts = layout[dtype]
+        start, end = pd.Timestamp(start).strftime("%Y-%m-%d"), pd.Timestamp(end).strftime("%Y-%m-%d")
+
+        frames = []
+        if legacy:
+            if self._month_slices(legacy):
+                for month in _months_between(start, end):
+                    frames.append((0, self._load(legacy, month)))
+            else:
+                # Cột ngày kiểu lạ không lọc được -> đọc cả file như cũ
+                frames.append((0, self._load(legacy)))
+        for key, meta in parts:
+            if _partition_in_range(key, start, end):
+                frames.append((2 if len(key) == 10 else 1, self._load(meta)))
+
+        if not frames:
+            any_meta = legacy or (parts[0][1] if parts else None)
+            return self._empty(any_meta) if any_meta else pd.DataFrame()
+        return _merge_layers(frames)
+
+# ==============================================================================
+# 6. SỔ MỐC NGÀY ĐÃ CÀO (WATERMARK) - KHỎI TẢI CẢ FILE ĐỂ TÌM max(Ngay_Cào)
+# ==============================================================================
+def _footer_max_day(service, meta):
+    """Ngày lớn nhất trong file, ưu tiên đọc min/max ở footer parquet, thiếu thống kê mới đọc cột."""
+    path, _ = download_to_cache(service, meta)
+    pf = pq.ParquetFile(path)
+    names = pf.schema_arrow.names
+    if 'Ngay_Cào' not in names: return None
+    col = names.index('Ngay_Cào')
+
+    best = None
+    for rg in range(pf.metadata.num_row_groups):
+        stats = pf.metadata.row_group(rg).column(col).statistics
+        if stats is None or not stats.has_min_max:
+            days = _day_strings(pd.read_parquet(path, columns=['Ngay_Cào'])).dropna()
+            return days.max() if not days.empty else None
+        value = str(stats.max)[:10]
+        if best is None or value > best: best = value
+    return best
+
+
+def data_watermark(service, catalog, dtype):
+    """
+    Mốc suy từ dữ liệu, chỉ dùng khi sổ chưa có loại này (lần chạy đầu sau khi nâng cấp).
+    Partition ngày thì tên file là đủ, file tháng / file gốc mới phải ngó footer.
+    """
+    marks = []
+    for key, meta in catalog.partitions(service, dtype):
+        marks.append(key if DAY_KEY.match(key) else _footer_max_day(service, meta))
+    legacy = catalog.find(service, f"{dtype}.parquet")
+    if legacy: marks.append(_footer_max_day(service, legacy))
+    marks = [m for m in marks if m and DAY_KEY.match(m)]
+    return max(marks) if marks else None
+
+
+class WatermarkManifest:
+    """
+    {loại dữ liệu: 'YYYY-MM-DD' ngày cuối đã lên Drive đủ} của 1 scraper, lưu thành JSON vài chục byte.
+    Mỗi loại có mốc riêng, loại nào ngày đó không có dòng nào vẫn được nhích mốc
+    (không như max(Ngay_Cào) phải đợi có dữ liệu mới biết).
+    """
+
+    def __init__(self, catalog, name):
+        self.catalog = catalog
+        self.file_name = f"{WATERMARK_PREFIX}{name}.json"
+        self.marks = {}
+
+    def load(self, service, dtypes):
+        """Đọc sổ trên Drive, loại nào chưa có mốc thì suy từ dữ liệu. Trả về {loại: mốc hoặc None}."""
+        meta = self.catalog.find(service, self.file_name)
+        if meta:
+            self.marks = json.loads(service.files().get_media(fileId=meta['id']).execute())
+        for dtype in dtypes:
+            if dtype not in self.marks:
+                mark = data_watermark(service, self.catalog, dtype)
+                if mark: self.marks[dtype] = mark
+        if not meta and self.marks:
+            # Lần đầu chưa có sổ: loại nào chưa từng có dòng nào thì theo mốc mới nhất của mấy loại kia
+            # (y như logic cũ), khỏi cào lại từ đầu cả lịch sử chỉ vì nó trống
+            newest = max(self.marks.values())
+            for dtype in dtypes: self.marks.setdefault(dtype, newest)
+        return {dtype: self.marks.get(dtype) for dtype in dtypes}
+
+    def advance(self, service, dtypes, day):
+        """Ngày `day` đã lên Drive đủ cho các loại này -> nhích mốc (không bao giờ lùi) rồi ghi sổ."""
+        for dtype in dtypes:
+            if self.marks.get(dtype) is None or self.marks[dtype] < day:
+                self.marks[dtype] = day
+        self.save(service)
+
+    def save(self, service):
+        body = json.dumps(self.marks, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        media = MediaIoBaseUpload(io.BytesIO(body), mimetype='application/json')
+        meta = self.catalog.find(service, self.file_name)
+        if meta:
+            meta = service.files().update(fileId=meta['id'], media_body=media, fields=FILE_FIELDS).execute()
+        else:
+            file_metadata = {'name': self.file_name, 'parents': [self.catalog.folder_id]}
+            meta = service.files().create(body=file_metadata, media_body=media, fields=FILE_FIELDS).execute()
+        self.catalog.remember(meta)
+
+# ==============================================================================
+# 7. HOT RELOAD - DRIVE CÓ FILE MỚI THÌ NẠP LẠI, KHÔNG CẦN KHỞI ĐỘNG LẠI SERVER
+# ==============================================================================
+def dataset_signature(service, catalog, dtype):
+    """Chữ ký phiên bản 1 loại dữ liệu: file gốc + mọi partition kèm md5/modifiedTime."""
+    version = lambda meta: meta.get('md5Checksum') or meta.get('modifiedTime')
+    legacy = catalog.find(service, f"{dtype}.parquet")
+    return (version(legacy) if legacy else None,
+            tuple((key, version(meta)) for key, meta in catalog.partitions(service, dtype)))
+
+
+class DataRefresher:
+    """
+    Luồng nền cứ interval giây list lại folder Drive 1 lần. Loại nào đổi chữ ký thì gọi
+    apply_fn(service, [loại đổi]) để nạp đúng mấy loại đó; apply_fn dựng xong bản mới rồi
+    mới tráo vào, request đang chạy vẫn đọc bản cũ tới lúc tráo.
+    Mọi refresher trong process được ghi danh để /api/admin/reload gọi 1 phát là nạp hết
+    (kể cả khi ghép 1_map + 2_map vào chung 1 app).
+    listeners: hàm fn(tên, [loại đổi]) gọi sau mỗi lần tráo data (wsgi.py dùng để bảo gunicorn thay worker).
+    """
+    _all = []
+    listeners = []
+
+    def __init__(self, name, catalog, dtypes, service_factory, apply_fn, interval=REFRESH_INTERVAL):
+        self.name = name
+        self.catalog = catalog
+        self.dtypes = list(dtypes)
+        self.service_factory = service_factory
+        self.apply_fn = apply_fn
+        self.interval = interval
+        self._sigs = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        DataRefresher._all.append(self)
+
+    def mark(self, service):
+        """Ghi lại chữ ký của bản vừa nạp (gọi cuối load_all_data)."""
+        self._sigs = {d: dataset_signature(service, self.catalog, d) for d in self.dtypes}
+
+    def check(self, force=False):
+        """Hỏi Drive 1 lần, có loại đổi thì nạp lại. Trả về list loại đã nạp lại."""
+        with self._lock:
+            service = self.service_factory()
+            self.catalog.refresh(service)
+            sigs = {d: dataset_signature(service, self.catalog, d) for d in self.dtypes}
+            changed = [d for d in self.dtypes if force or sigs[d] != self._sigs.get(d)]
+            if changed:
+                start = time.time()
+                print(f"🔄 [{self.name}] Drive có bản mới: {', '.join(changed)} -> nạp lại...")
+                self.apply_fn(service, changed)
+                print(f"✅ [{self.name}] Đã tráo data mới sau {time.time() - start:.1f}s")
+                for fn in DataRefresher.listeners: fn(self.name, changed)
+            # apply_fn lỗi thì chưa ghi chữ ký mới -> vòng sau thử lại
+            self._sigs = sigs
+            return changed
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try: self.check()
+            except Exception as e: print(f"⚠️ [{self.name}] Hỏi Drive lỗi, vòng sau thử lại: {e}")
+
+    def start(self):
+        """Bật luồng nền (gọi nhiều lần cũng chỉ 1 luồng)."""
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()): return
+        self._thread = threading.Thread(target=self._loop, name=f"refresh-{self.name}", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def check_all(cls, force=False):
+        return {r.name: r.check(force) for r in cls._all}
+
+# ==============================================================================
+# 8. SCHEMA CỐ ĐỊNH CHO 15 LOẠI DATA + HÀM GHI PARQUET DÙNG CHUNG (1.py / 2.py / 3.py)
+# ==============================================================================
+# Ép kiểu 1 lần lúc ghi: server đọc Arrow ra là dùng luôn, khỏi to_datetime / đoán format mỗi lần load.
+TIME = pa.timestamp('ns')
+LABEL = pa.dictionary(pa.int32(), pa.string())  # chuỗi lặp lại ít giá trị, đọc ra là category luôn
+TEXT = pa.string()
+
+# Giờ Subiz hiện trên bảng (= subiz_scraper.NETWORK_TIME_FORMAT) thử trước, để pandas tự đoán
+# thì hay đọc 05/01 thành mùng 1 tháng 5. Ô nào không khớp format nào mới đoán (ngày trước tháng).
+SOURCE_TIME_FORMATS = ("%H:%M %d/%m/%Y", "ISO8601")
+
+# Ticket / Zalo / SLA (1.py)
+CONVO_SCHEMA = pa.schema([
+    ("Nhân viên hệ thống", LABEL), ("Loại", LABEL), ("Khách hàng", TEXT), ("Tags", LABEL),
+    ("Agent Subiz", LABEL), ("Thời gian", TIME), ("Ngay_Cào", TIME),
+])
+# Call (2.py)
+CALL_SCHEMA = pa.schema([
+    ("SDT", TEXT), ("Trạng thái", LABEL), ("Tags", LABEL), (DURATION_TEXT, TEXT), (DURATION_COLUMN, pa.int32()),
+    ("Agent thực hiện", LABEL), ("Thời gian tạo", TIME), ("Nhân viên hệ thống", LABEL),
+    ("Loại cuộc gọi", LABEL), ("Ngay_Cào", TIME),
+])
+# Miss hội thoại / Miss Zalo (3.py)
+MISS_CONVO_SCHEMA = pa.schema([
+    ("Loại", LABEL), ("Khách hàng", TEXT), ("Tags", LABEL), ("Channel_Code", LABEL),
+    ("Thời gian", TIME), ("Ngay_Cào", TIME),
+])
+# Miss Call (3.py)
+MISS_CALL_SCHEMA = pa.schema([
+    ("SDT", TEXT), ("Trạng thái", LABEL), ("Thời gian tạo", TIME), ("Loại báo cáo", LABEL), ("Ngay_Cào", TIME),
+])
+
+DATASET_SCHEMAS = {
+    "Ticket_Trong_Gio": CONVO_SCHEMA, "Ticket_Ngoai_Gio": CONVO_SCHEMA,
+    "Zalo_Trong_Gio": CONVO_SCHEMA, "Zalo_Ngoai_Gio": CONVO_SCHEMA,
+    "SLA_Ticket_Trong_Gio": CONVO_SCHEMA, "SLA_Ticket_Ngoai_Gio": CONVO_SCHEMA,
+    "SLA_Zalo_Trong_Gio": CONVO_SCHEMA, "SLA_Zalo_Ngoai_Gio": CONVO_SCHEMA,
+    "Call_Den_Trong_Gio": CALL_SCHEMA, "Call_Di_Trong_Gio": CALL_SCHEMA,
+    "Call_Den_Ngoai_Gio": CALL_SCHEMA, "Call_Di_Ngoai_Gio": CALL_SCHEMA,
+    "Miss_Hoi_Thoai": MISS_CONVO_SCHEMA, "Miss_Zalo": MISS_CONVO_SCHEMA,
+    "Miss_Call": MISS_CALL_SCHEMA,
+}
+
+
+def dataset_of(file_name):
+    """'Call_Den_Trong_Gio__2026-01-05(.parquet)' -> 'Call_Den_Trong_Gio'."""
+    if file_name.endswith(".parquet"): file_name = file_name[:-len(".parquet")]
+    return file_name.split(PARTITION_SEP)[0]
+
+
+def parse_source_times(values):
+    """Cột giờ chữ lúc cào -> datetime64. Thử từng format quen (parse bằng C), ô nào sót mới đoán."""
+    if pd.api.types.is_datetime64_any_dtype(values): return values
+    text = values.astype(str)
+    out = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    rest = np.ones(len(values), dtype=bool)
+    for fmt in SOURCE_TIME_FORMATS:
+        if not rest.any(): break
+        out[rest] = pd.to_datetime(text[rest], format=fmt, errors='coerce')
+        rest = out.isna().to_numpy()
+    if rest.any(): out[rest] = pd.to_datetime(text[rest], format='mixed', dayfirst=True, errors='coerce')
+    return out
+
+
+def schema_matches(dtype, arrow_schema):
+    """File đã ghi đúng schema của loại chưa (đủ cột, đúng kiểu)."""
+    schema = DATASET_SCHEMAS.get(dtype)
+    if schema is None: return True
+    return all(f.name in arrow_schema.names and arrow_schema.field(f.name).type == f.type for f in schema)
+
+
+def conform_frame(dtype, df):
+    """
+    Ép DataFrame về đúng schema của loại: giờ -> timestamp, nhãn -> category, thời lượng -> int32.
+    Thiếu cột thì thêm cột rỗng, cột lạ ngoài schema để nguyên ở cuối.
+    Trả về (DataFrame mới, pyarrow schema để ghi); loại chưa đăng ký thì schema None (pyarrow tự đoán như cũ).
+    """
+    schema = DATASET_SCHEMAS.get(dtype)
+    if schema is None: return df, None
+    df = df.copy()
+    if DURATION_COLUMN in schema.names: add_duration_seconds(df)
+    for field in schema:
+        col = df[field.name] if field.name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if pa.types.is_timestamp(field.type):
+            df[field.name] = parse_source_times(col).astype('datetime64[ns]')
+        elif pa.types.is_dictionary(field.type):
+            df[field.name] = col.astype('string').astype('category')
+        elif pa.types.is_integer(field.type):
+            df[field.name] = col.fillna(0).astype(field.type.to_pandas_dtype())
+        else:
+            text = col.astype('string')
+            df[field.name] = text.astype(object).where(text.notna(), None)
+
+    extras = [c for c in df.columns if c not in schema.names]
+    df = df[schema.names + extras]
+    if extras:
+        schema = pa.schema(list(schema) + list(pa.Schema.from_pandas(df[extras], preserve_index=False)))
+    return df, schema
+
+
+def frame_to_parquet(dtype, df):
+    """DataFrame -> buffer parquet đúng schema của loại (đã seek về đầu, đưa thẳng cho MediaIoBaseUpload)."""
+    df, schema = conform_frame(dtype, df)
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False), buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def upload_parquet(service, catalog, file_name, df, file_id=None):
+    """
+    Hàm ghi chung của các scraper: ép đúng schema rồi ghi đè (có file_id) hoặc tạo mới '<file_name>.parquet'.
+    Trả về metadata (đã ghi vào danh bạ), lỗi thì trả None -> người gọi không nhích mốc / không xóa file ngày.
+    """
+    try:
+        # Ép schema cũng nằm trong try: dữ liệu lạ làm hỏng bước ép thì vẫn trả None như upload lỗi
+        media = MediaIoBaseUpload(frame_to_parquet(dataset_of(file_name), df),
+                                  mimetype='application/octet-stream', resumable=True)
+        if file_id:
+            meta = service.files().update(fileId=file_id, media_body=media, fields=FILE_FIELDS).execute()
+            print(f"      ✅ [Update] {file_name} ngon lành cành đào ({len(df)} dòng).")
+        else:
+            file_metadata = {'name': f"{file_name}.parquet", 'parents': [catalog.folder_id]}
+            meta = service.files().create(body=file_metadata, media_body=media, fields=FILE_FIELDS).execute()
+            print(f"      🆕 [New] {file_name} đập hộp thành công ({len(df)} dòng).")
+        catalog.remember(meta) # Cập nhật danh bạ luôn, khỏi list lại / ngày sau update đúng id
+        return meta
+    except Exception as e:
+        print(f"      🔥 [LỖI] Không đẩy được file {file_name}: {e}")
+        return None
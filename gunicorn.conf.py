@@ -0,0 +1,34 @@
+import os
+import multiprocessing
+
+# ==============================================================================
+# CẤU HÌNH GUNICORN CHO wsgi.py  (gunicorn -c gunicorn.conf.py wsgi:app)
+# ==============================================================================
+# Đổi bằng biến môi trường, khỏi sửa file:
+#   WEB_BIND=0.0.0.0:5000  WEB_WORKERS=4  WEB_THREADS=8
+# Thay worker nhẹ nhàng (nạp lại code/cấu hình, data giữ nguyên):  kill -HUP <pid process cha>
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+
+# Mỗi worker 1 process, data chung RAM nhờ preload nên thêm worker không tốn gấp đôi RAM
+workers = int(os.environ.get("WEB_WORKERS", str(min(4, multiprocessing.cpu_count()))))
+# Mỗi worker nhiều luồng: mấy người cùng mở báo cáo nhóm không phải xếp hàng sau 1 luồng
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", "8"))
+
+# Nạp data 1 lần ở process cha rồi mới fork worker
+preload_app = True
+
+keepalive = 5           # Giữ kết nối cho trình duyệt gọi liền 2 API
+timeout = 300           # Request đầu tiên có khi phải tải partition từ Drive
+graceful_timeout = 60   # Lúc thay worker, worker cũ có chừng này giây trả nốt request đang dở
+
+accesslog = "-"
+errorlog = "-"
+
+
+def when_ready(server):
+    """Process cha đã nạp xong data, chuẩn bị fork: bật hot reload kiểu nhiều worker."""
+    import wsgi
+    wsgi.enable_master_reload()
+    server.log.info("🚀 SERVER ĐÃ SẴN SÀNG! %s worker x %s luồng", workers, threads)
@@ -1,56 +1,156 @@
 import subprocess
 import sys
+import os
 import time
+import threading
+import urllib.request
 
 # ==============================================================================
 # MASTER RUNNER - ĐỆ TỬ TỔNG QUẢN CỦA ĐẠI CA ĐẸP TRAI
 # ==============================================================================
+# 1/2/3.py cào các loại report khác nhau -> cho chạy song song, mỗi đứa 1 Chrome Debugger riêng.
+# Bước nào có "after" thì chỉ chạy khi mấy bước kia xong ngon (mã 0), thằng nào toang thì bước sau bỏ qua.
+#
+# Bật sẵn 3 Chrome trước khi chạy, ví dụ:
+#   chrome --remote-debugging-port=9222 --user-data-dir=C:\chrome_9222
+#   chrome --remote-debugging-port=9223 --user-data-dir=C:\chrome_9223
+#   chrome --remote-debugging-port=9224 --user-data-dir=C:\chrome_9224
 
-def run_script(script_name):
-    """Gọi hồn các file script của đại ca ra làm việc."""
-    print(f"\n{'='*60}")
-    print(f"🚀 ĐANG TRIÊU HỒI: {script_name}")
-    print(f"{'='*60}")
-    
+# Link bảo server API nạp lại data sau khi upload xong (để trống thì bỏ qua bước reload)
+#   ví dụ API_RELOAD_URL=http://127.0.0.1:5000/api/admin/reload, token phải trùng API_RELOAD_TOKEN của server
+API_RELOAD_URL = os.environ.get("API_RELOAD_URL", "")
+API_RELOAD_TOKEN = os.environ.get("API_RELOAD_TOKEN", "")
+
+PIPELINE = {
+    "1.py":   {"script": "1.py", "env": {"SUBIZ_DEBUGGERS": "127.0.0.1:9222"}},
+    "2.py":   {"script": "2.py", "env": {"SUBIZ_DEBUGGERS": "127.0.0.1:9223"}},
+    "3.py":   {"script": "3.py", "env": {"SUBIZ_DEBUGGERS": "127.0.0.1:9224"}},
+    "reload": {"call": "reload_api", "after": ["1.py", "2.py", "3.py"]},
+}
+
+# Số bước chạy cùng lúc tối đa (máy yếu thì hạ xuống 1 là quay về chạy lần lượt như xưa)
+MAX_PARALLEL = 3
+
+# ==============================================================================
+# 1. CÁC BƯỚC
+# ==============================================================================
+_PRINT_LOCK = threading.Lock()
+
+def log(name, line):
+    """In có gắn tên bước, 3 đứa chạy cùng lúc không bị lẫn log."""
+    with _PRINT_LOCK:
+        print(f"[{name}] {line}", flush=True)
+
+def _pipe_output(name, stream):
+    for line in iter(stream.readline, ''):
+        log(name, line.rstrip())
+    stream.close()
+
+def run_script(name, script_name, env=None):
+    """Gọi hồn các file script của đại ca ra làm việc, trả về mã thoát."""
+    log(name, f"🚀 ĐANG TRIÊU HỒI: {script_name}")
+    child_env = dict(os.environ, PYTHONUNBUFFERED="1", PYTHONIOENCODING="utf-8", **(env or {}))
+    # Chạy file bằng chính trình thông dịch Python đang dùng
+    process = subprocess.Popen(
+        [sys.executable, script_name],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        env=child_env,
+    )
+    _pipe_output(name, process.stdout)
+    return process.wait()
+
+def reload_api(name):
+    """Bảo server API nạp lại data mới (chỉ chạy khi cả 3 đứa đã upload xong)."""
+    if not API_RELOAD_URL:
+        log(name, "⏭️ Chưa cấu hình API_RELOAD_URL, bỏ qua bước reload")
+        return 0
+    req = urllib.request.Request(API_RELOAD_URL, method="POST",
+                                 headers={"X-Reload-Token": API_RELOAD_TOKEN})
+    with urllib.request.urlopen(req, timeout=600) as resp:
+        log(name, f"🔄 API đã nạp lại data (HTTP {resp.status})")
+    return 0
+
+STEP_CALLS = {"reload_api": reload_api}
+
+# ==============================================================================
+# 2. CHẠY THEO ĐỒ THỊ PHỤ THUỘC
+# ==============================================================================
+def _run_step(name, step, results):
+    start = time.time()
     try:
-        # Chạy file bằng chính trình thông dịch Python đang dùng
-        # Chạy lần lượt (sequence), thằng này xong mới đến thằng kia
-        process = subprocess.Popen(
-            [sys.executable, script_name],
-            stdout=sys.stdout,
-            stderr=sys.stderr,
-            text=True
-        )
-        
-        # Chờ thằng đệ làm xong việc mới cho thằng tiếp theo vào
-        process.wait()
-        
-        if process.returncode == 0:
-            print(f"\n✅ {script_name} ĐÃ HOÀN THÀNH NHIỆM VỤ!")
+        if "script" in step:
+            code = run_script(name, step["script"], step.get("env"))
         else:
-            print(f"\n🔥 CẢNH BÁO: {script_name} CÓ BIẾN (Mã lỗi: {process.returncode})")
-            
+            code = STEP_CALLS[step["call"]](name)
     except Exception as e:
-        print(f"❌ Toang rồi đại ca ơi! Không chạy được {script_name}: {e}")
+        log(name, f"❌ Toang rồi đại ca ơi! Không chạy được {name}: {e}")
+        code = -1
+    elapsed = time.time() - start
+
+    if code == 0:
+        log(name, f"✅ {name} ĐÃ HOÀN THÀNH NHIỆM VỤ! ({elapsed / 60:.2f} phút)")
+    else:
+        log(name, f"🔥 CẢNH BÁO: {name} CÓ BIẾN (Mã lỗi: {code})")
+    results[name] = {"status": "ok" if code == 0 else "lỗi", "code": code, "elapsed": elapsed}
+
+def run_pipeline(pipeline, max_parallel=MAX_PARALLEL):
+    """Chạy bước nào đủ điều kiện trước, tối đa max_parallel bước cùng lúc. Trả về kết quả từng bước."""
+    for name, step in pipeline.items():
+        for dep in step.get("after", []):
+            if dep not in pipeline:
+                raise ValueError(f"Bước {name} phụ thuộc {dep} mà {dep} không có trong PIPELINE")
+
+    results = {}
+    running = {}
+    pending = list(pipeline)
+
+    while pending or running:
+        # Dọn mấy bước đã xong
+        for name in [n for n, t in running.items() if not t.is_alive()]:
+            running.pop(name).join()
+
+        for name in list(pending):
+            deps = pipeline[name].get("after", [])
+            failed = [d for d in deps if d in results and results[d]["status"] != "ok"]
+            if failed:
+                # Bước trước toang thì bước này thôi khỏi chạy (không reload data dở dang)
+                pending.remove(name)
+                results[name] = {"status": "bỏ qua", "code": None, "elapsed": 0.0}
+                log(name, f"⏭️ Bỏ qua vì {', '.join(failed)} không xong")
+            elif all(d in results for d in deps) and len(running) < max_parallel:
+                pending.remove(name)
+                t = threading.Thread(target=_run_step, args=(name, pipeline[name], results), daemon=True)
+                running[name] = t
+                t.start()
+
+        if pending and not running and all(
+                any(d not in results for d in pipeline[n].get("after", [])) for n in pending):
+            raise ValueError(f"PIPELINE bị vòng lặp phụ thuộc: {pending}")
+        time.sleep(0.5)
+
+    return results
 
 def main():
     start_time = time.time()
-    
-    print("💎 CHÀO ĐẠI CA ĐẸP TRAI! HỆ THỐNG BẮT ĐẦU CÀY DATA...")
-    
-    # Danh sách các file đệ tử cần gọi (Đúng tên file của đại ca)
-    scripts = ["1.py", "2.py", "3.py"]
-    
-    for script in scripts:
-        run_script(script)
-        # Nghỉ tay 2 giây giữa các script cho trình duyệt kịp thở
-        time.sleep(2)
-    
+
+    print("💎 CHÀO ĐẠI CA ĐẸP TRAI! HỆ THỐNG BẮT ĐẦU CÀY DATA (CHẠY SONG SONG)...")
+    results = run_pipeline(PIPELINE)
+
     total_time = (time.time() - start_time) / 60
     print(f"\n{'*'*60}")
+    for name in PIPELINE:
+        r = results[name]
+        code = "-" if r["code"] is None else r["code"]
+        print(f"   {name:<8} | {r['status']:<6} | mã {code!s:<4} | {r['elapsed'] / 60:.2f} phút")
     print(f"💎 TẤT CẢ ĐÃ XONG XUÔI! TỔNG THỜI GIAN CÀY CUỐC: {total_time:.2f} PHÚT")
-    print(f"ĐẠI CA ĐI TÁN GÁI TIẾP ĐI, MỌI THỨ ĐÃ LÊN CLOUD NGON CHOÉT!")
+    if all(r["status"] == "ok" for r in results.values()):
+        print(f"ĐẠI CA ĐI TÁN GÁI TIẾP ĐI, MỌI THỨ ĐÃ LÊN CLOUD NGON CHOÉT!")
     print(f"{'*'*60}")
+    return 0 if all(r["status"] == "ok" for r in results.values()) else 1
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
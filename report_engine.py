@@ -0,0 +1,500 @@
+import re
+import datetime
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# REPORT ENGINE - BỘ NÃO TÍNH TOÁN DÙNG CHUNG CHO CÁC SERVER BÁO CÁO
+# ==============================================================================
+# Các file server (run_bc.py, 1_map.py...) chỉ lo tải data, còn phần tính toán
+# nặng đô thì gom về đây để khỏi copy đi copy lại.
+
+# Khóa của khối tổng hợp (Cube) cho Dashboard Tổng (Logic 1)
+CUBE_KEYS = ['Day', 'Agent', 'Product_Label', 'Source_File', 'Is_Trong_Gio', 'Hour', 'Weekday']
+
+# Luật phân loại sản phẩm Logic 1: (file nguồn chứa, tag chứa, nhãn).
+# Thứ tự y hệt detect_product_v3 cũ - luật nào khớp trước thì ăn trước.
+PRODUCT_RULES_V1 = [
+    ("Call_Den", None, "Tổng đài GỌI VÀO"),
+    ("Call_Di", None, "Tổng đài GỌI RA"),
+    (None, "MBHXH", "Hỗ trợ BHXH"),
+    ("Ticket", "EINVOICE1.0", "Subiz 1.0"),
+    ("Ticket", "EINVOICE2.0", "Subiz 2.0"),
+    ("Ticket", "SMI", "SMI (Hóa Đơn)"),
+    ("Ticket", "MTNCN", "MCTTNCN (Thuế)"),
+    ("Ticket", "CKS", "Hỗ trợ CKS"),
+    ("Ticket", "M2SALE", "M2SALE"),
+    ("Ticket", "MSELLER", "MSELLER (Máy POS)"),
+    ("Zalo", None, "Zalo OA"),
+]
+DEFAULT_PRODUCT_V1 = "Sản phẩm khác"
+
+# Cột bitmask tag cho Dashboard Nhóm (Logic 2), tính 1 lần lúc load
+TAG_BITS_COLUMN = "Tag_Bits"
+
+# File ticket/zalo của Dashboard Nhóm: (kênh, loại, file). Thứ tự = thứ tự pd.concat cũ
+# (ticket trước zalo, SLA trong giờ trước ngoài giờ) -> thứ tự gặp nhân viên y như cũ
+GROUP_SOURCES = [
+    ("subiz", "in", "Ticket_Trong_Gio"),
+    ("subiz", "out", "Ticket_Ngoai_Gio"),
+    ("subiz", "miss", "Miss_Hoi_Thoai"),
+    ("subiz", "sla", "SLA_Ticket_Trong_Gio"),
+    ("subiz", "sla", "SLA_Ticket_Ngoai_Gio"),
+    ("zalo", "in", "Zalo_Trong_Gio"),
+    ("zalo", "out", "Zalo_Ngoai_Gio"),
+    ("zalo", "miss", "Miss_Zalo"),
+    ("zalo", "sla", "SLA_Zalo_Trong_Gio"),
+    ("zalo", "sla", "SLA_Zalo_Ngoai_Gio"),
+]
+GROUP_CHANNELS = ("subiz", "zalo")
+NO_DAY = np.iinfo(np.int64).min  # Dòng không có Ngay_Cào
+
+# Tung độ scatter SLA Logic 1 theo phút trong ngày: round(giờ + phút/60, 2) tính sẵn bằng round của Python
+MINUTE_OF_DAY_Y = np.array([round(h + m / 60, 2) for h in range(24) for m in range(60)])
+
+
+def calc_growth(current, prev):
+    """Tính tăng trưởng chuẩn chỉ."""
+    if prev == 0:
+        return 100 if current > 0 else 0
+    return round(((current - prev) / prev) * 100, 1)
+
+# ==============================================================================
+# 1. PHÂN LOẠI SẢN PHẨM & SỐ PHÚT (VECTOR HÓA, CHẠY LÚC LOAD DATA)
+# ==============================================================================
+def classify_products_v1(tags, source_files, categories=None):
+    """Bản vector hóa của detect_product_v3: str.contains + np.select, trả về cột categorical."""
+    tags_up = tags.astype(str).str.upper()
+    conditions = []
+    labels = []
+    for src_kw, tag_kw, label in PRODUCT_RULES_V1:
+        cond = np.ones(len(tags_up), dtype=bool)
+        if src_kw: cond &= source_files.str.contains(src_kw, regex=False).to_numpy(dtype=bool)
+        if tag_kw: cond &= tags_up.str.contains(tag_kw, regex=False).to_numpy(dtype=bool)
+        conditions.append(cond)
+        labels.append(label)
+
+    result = np.select(conditions, labels, default=DEFAULT_PRODUCT_V1)
+    if categories is None:
+        categories = list(dict.fromkeys(labels + [DEFAULT_PRODUCT_V1]))
+    return pd.Series(pd.Categorical(result, categories=categories), index=tags.index)
+
+
+def call_minutes_v1(seconds, source_files):
+    """
+    Số phút cho Logic 1 = Duration_Sec / 60 (số giây đã parse sẵn lúc ghi, xem drive_io.add_duration_seconds),
+    file không phải Call thì = 0.
+    """
+    out = np.zeros(len(source_files), dtype=float)
+    is_call = source_files.str.contains('Call', regex=False).to_numpy(dtype=bool)
+    if seconds is None or not is_call.any():
+        return pd.Series(out, index=source_files.index)
+    out[is_call] = seconds.to_numpy(dtype=float)[is_call] / 60
+    return pd.Series(out, index=source_files.index)
+
+# ==============================================================================
+# 2. CUBE CHO DASHBOARD TỔNG (/api/get-data)
+# ==============================================================================
+def build_v1_cube(full_df):
+    """
+    Ép toàn bộ dữ liệu thô thành khối tổng hợp theo
+    (ngày, nhân viên, sản phẩm, file nguồn, trong/ngoài giờ, giờ, thứ).
+    Làm 1 lần lúc load data, request sau chỉ cắt lát theo ngày rồi cộng lại.
+    """
+    if full_df is None or full_df.empty:
+        return None
+
+    df = full_df[full_df['Date_Obj'].notna()]
+    work = pd.DataFrame({
+        'Day': df['Date_Obj'].dt.normalize(),
+        'Agent': df['Nhân viên hệ thống'] if 'Nhân viên hệ thống' in df.columns else None,
+        'Product_Label': df['Product_Label'],
+        'Source_File': df['Source_File'],
+        'Is_Trong_Gio': df['Source_File'].str.contains('Trong_Gio').astype('int8'),
+        'Hour': df['Date_Obj'].dt.hour.astype('int8'),
+        'Weekday': df['Date_Obj'].dt.weekday.astype('int8'),
+        'Is_Interaction': df['Is_Interaction'].astype('int8'),
+        'Is_SLA_File': df['Is_SLA_File'].astype('int8'),
+        'Minutes': df['Minutes'],
+    })
+
+    cube = work.groupby(CUBE_KEYS + ['Is_Interaction', 'Is_SLA_File'], dropna=False, observed=True, sort=False) \
+               .agg(n=('Minutes', 'size'), minutes=('Minutes', 'sum')).reset_index()
+    cube['Is_Ngoai_Gio'] = cube['Source_File'].str.contains('Ngoai_Gio').astype('int8')
+    cube = cube.sort_values('Day', kind='stable').reset_index(drop=True)
+
+    # Scatter SLA cần từng điểm một nên giữ lại bảng mỏng, đúng thứ tự gốc, x/y tính sẵn luôn
+    sla = df[df['Is_SLA_File'] == 1]
+    ts = sla['Date_Obj']
+    sla_points = pd.DataFrame({
+        'Day': ts.dt.normalize(),
+        'Agent': sla['Nhân viên hệ thống'] if 'Nhân viên hệ thống' in sla.columns else None,
+        'x': _isoformat(ts),
+        'y': MINUTE_OF_DAY_Y[(ts.dt.hour * 60 + ts.dt.minute).to_numpy()],
+        'label': sla['Product_Label'],
+    }).reset_index(drop=True)
+
+    agents = []
+    if 'Nhân viên hệ thống' in full_df.columns:
+        agents = [a for a in full_df['Nhân viên hệ thống'].unique() if a and not pd.isna(a)]
+
+    print(f"   🧊 Cube Logic 1: {len(full_df)} dòng thô -> {len(cube)} ô tổng hợp")
+    return {"cube": cube, "sla_points": sla_points, "agents": agents}
+
+
+def _isoformat(ts):
+    """Series datetime -> chuỗi y hệt Timestamp.isoformat() (có lẻ giây thì mới in phần lẻ)."""
+    iso = ts.dt.strftime('%Y-%m-%dT%H:%M:%S')
+    frac = ((ts.dt.microsecond != 0) | (ts.dt.nanosecond != 0)).to_numpy()
+    if frac.any(): iso[frac] = [t.isoformat() for t in ts[frac]]
+    return iso
+
+
+def slice_cube_by_day(cube, d_start, d_end):
+    """Cắt lát cube theo khoảng ngày (cube đã sort theo Day nên dùng searchsorted)."""
+    days = cube['Day'].values
+    lo = days.searchsorted(pd.Timestamp(d_start).to_datetime64(), side='left')
+    hi = days.searchsorted(pd.Timestamp(d_end).to_datetime64(), side='right')
+    return cube.iloc[lo:hi]
+
+
+def _sum_by(df, col, size):
+    return [int(v) for v in df.groupby(col)['n'].sum().reindex(range(size), fill_value=0).tolist()]
+
+
+def query_v1_cube(cube_db, d_start, d_end, products):
+    """Trả lời /api/get-data cho khoảng [d_start, d_end] chỉ bằng cube."""
+    if not cube_db:
+        return {}
+    cube = cube_db['cube']
+
+    # Logic tính Previous Period
+    delta_days = (d_end - d_start).days + 1
+    d_prev_end = d_start - datetime.timedelta(days=1)
+    d_prev_start = d_prev_end - datetime.timedelta(days=delta_days - 1)
+
+    df_curr = slice_cube_by_day(cube, d_start, d_end)
+    df_prev = slice_cube_by_day(cube, d_prev_start, d_prev_end)
+
+    total_room_interaction = int(df_curr.loc[df_curr['Is_Interaction'] == 1, 'n'].sum())
+    curr_by_agent = {k: g for k, g in df_curr.groupby('Agent', sort=False, observed=True)}
+    prev_by_agent = {k: g for k, g in df_prev.groupby('Agent', sort=False, observed=True)}
+
+    sla_points = cube_db['sla_points']
+    sla_days = sla_points['Day']
+    sla_curr = sla_points[(sla_days >= pd.Timestamp(d_start)) & (sla_days <= pd.Timestamp(d_end))]
+    sla_by_agent = {k: g for k, g in sla_curr.groupby('Agent', sort=False, observed=True)}
+
+    output_db = {}
+    empty = df_curr.iloc[0:0]
+    for agent in cube_db['agents']:
+        u_curr = curr_by_agent.get(agent, empty)
+        u_prev = prev_by_agent.get(agent, empty)
+        if u_curr.empty and u_prev.empty: continue
+
+        u_curr_inter = u_curr[u_curr['Is_Interaction'] == 1]
+        u_prev_inter = u_prev[u_prev['Is_Interaction'] == 1]
+        u_curr_sla = u_curr[u_curr['Is_SLA_File'] == 1]
+        u_prev_sla = u_prev[u_prev['Is_SLA_File'] == 1]
+
+        t_in = int(u_curr_inter.loc[u_curr_inter['Is_Trong_Gio'] == 1, 'n'].sum())
+        t_out = int(u_curr_inter.loc[u_curr_inter['Is_Ngoai_Gio'] == 1, 'n'].sum())
+        total_curr = t_in + t_out
+        total_prev = int(u_prev_inter['n'].sum())
+        sla_count_curr = int(u_curr_sla['n'].sum())
+        sla_count_prev = int(u_prev_sla['n'].sum())
+
+        # Gom theo sản phẩm 1 phát cho cả kỳ này lẫn kỳ trước
+        p_in = u_curr_inter[u_curr_inter['Is_Trong_Gio'] == 1].groupby('Product_Label', observed=True)['n'].sum()
+        p_out = u_curr_inter[u_curr_inter['Is_Ngoai_Gio'] == 1].groupby('Product_Label', observed=True)['n'].sum()
+        p_sla = u_curr_sla.groupby('Product_Label', observed=True)['n'].sum()
+        p_min = u_curr.groupby('Product_Label', observed=True)['minutes'].sum()
+        p_prev = u_prev_inter.groupby('Product_Label', observed=True)['n'].sum()
+
+        metrics = []
+        for p in products:
+            v_in = int(p_in.get(p, 0))
+            v_out = int(p_out.get(p, 0))
+            min_val = round(float(p_min.get(p, 0.0)), 2) if "Tổng đài" in p else None
+            metrics.append({
+                "id": p, "name": p, "in": v_in, "out": v_out, "sla": int(p_sla.get(p, 0)),
+                "growth": calc_growth(v_in + v_out, int(p_prev.get(p, 0))), "minutes": min_val
+            })
+
+        hourly_series = []
+        if not u_curr_inter.empty:
+            hourly = u_curr_inter.groupby(['Product_Label', 'Hour'], observed=True)['n'].sum()
+            for p in products:
+                if p in hourly.index.get_level_values(0):
+                    counts = [int(v) for v in hourly.loc[p].reindex(range(24), fill_value=0).tolist()]
+                    if sum(counts) > 0:
+                        hourly_series.append({"label": p, "data": counts})
+
+        scatter_sla = []
+        u_sla_points = sla_by_agent.get(agent)
+        if u_sla_points is not None:
+            scatter_sla = u_sla_points[['x', 'y', 'label']].to_dict('records')
+
+        output_db[agent] = {
+            "name": agent,
+            "avatar": agent[:2].upper(),
+            "workDays": f"{u_curr['Day'].nunique()} ngày",
+            "totalIn": t_in, "totalOut": t_out, "total": total_curr,
+            "totalRoom": total_room_interaction,
+            "growth": calc_growth(total_curr, total_prev),
+            "stats": {"slaCount": sla_count_curr, "slaGrowth": calc_growth(sla_count_curr, sla_count_prev)},
+            "metrics": metrics,
+            "charts": {
+                "dailyIn": _sum_by(u_curr_inter[u_curr_inter['Is_Trong_Gio'] == 1], 'Weekday', 7),
+                "dailyOut": _sum_by(u_curr_inter[u_curr_inter['Is_Ngoai_Gio'] == 1], 'Weekday', 7),
+                "dailySLA": _sum_by(u_curr_sla, 'Weekday', 7),
+                "hourlySeries": hourly_series
+            },
+            "scatterData": {"sla": scatter_sla}
+        }
+    return output_db
+
+# ==============================================================================
+# 3. BITMASK TAG CHO DASHBOARD NHÓM (/api/get-group-data)
+# ==============================================================================
+class TagBits:
+    """
+    Mỗi mẫu tag giữ 1 bit trong cột Tag_Bits (int32). Lúc load chỉ chạy str.contains trên
+    các giá trị Tags khác nhau (vài chục cái), request lọc tag chỉ còn AND bit, không regex,
+    không đụng vào cột Tags của cache.
+    Khớp y như cũ: filter_by_tag dùng tag làm regex ('EINVOICE1.0' thì dấu chấm khớp mọi ký tự),
+    filter_exclude_list dùng re.escape(tag) -> mỗi kiểu 1 mẫu, mẫu trùng nhau thì chung bit.
+    """
+
+    def __init__(self, tags):
+        self.bits = {}
+        for tag in tags:
+            for pattern in (tag, re.escape(tag)):
+                if pattern not in self.bits:
+                    self.bits[pattern] = 1 << len(self.bits)
+        if len(self.bits) > 31:
+            raise ValueError(f"Quá nhiều mẫu tag cho int32: {len(self.bits)}")
+
+    def encode(self, tags):
+        """Series Tags -> mảng int32 bitmask (ô trống / không phải chuỗi = 0 như na=False cũ)."""
+        codes, uniques = pd.factorize(tags)
+        uniques = pd.Series(np.asarray(uniques, dtype=object))
+        per_value = np.zeros(len(uniques) + 1, dtype=np.int32)  # ô cuối cho code -1 (NaN)
+        for pattern, bit in self.bits.items():
+            hit = uniques.str.contains(pattern, case=False, na=False).to_numpy(dtype=bool)
+            per_value[:-1][hit] |= bit
+        return per_value[codes]
+
+    def add_column(self, df):
+        """Gắn cột Tag_Bits vào frame lúc load (prepare hook)."""
+        tags = df['Tags'] if 'Tags' in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
+        df[TAG_BITS_COLUMN] = self.encode(tags)
+        return df
+
+    def bits_of(self, patterns):
+        """OR bit của các mẫu. Mẫu chưa đăng ký thì báo lỗi luôn (GroupCube không còn cột Tags để dò chậm)."""
+        bits = 0
+        for pattern in patterns:
+            if pattern not in self.bits: raise KeyError(f"Mẫu tag chưa đăng ký trong TagBits: {pattern}")
+            bits |= self.bits[pattern]
+        return bits
+
+    def _values(self, df):
+        values = df[TAG_BITS_COLUMN].to_numpy()
+        # concat với frame không có cột này thì pandas đổi sang float + NaN
+        if values.dtype.kind == 'f': values = np.nan_to_num(values).astype(np.int32)
+        return values
+
+    def mask(self, df, patterns):
+        """Mảng bool: dòng nào khớp ít nhất 1 mẫu (mẫu chưa đăng ký thì quay về str.contains)."""
+        bits = 0
+        slow = []
+        for pattern in patterns:
+            if pattern in self.bits: bits |= self.bits[pattern]
+            else: slow.append(pattern)
+        if TAG_BITS_COLUMN in df.columns:
+            hit = (self._values(df) & bits) != 0
+        else:
+            slow = list(patterns)
+            hit = np.zeros(len(df), dtype=bool)
+        if slow:
+            hit |= df['Tags'].str.contains('|'.join(slow), case=False, na=False).to_numpy(dtype=bool)
+        return hit
+
+# ==============================================================================
+# 4. ĐẾM 1 LƯỢT CHO DASHBOARD NHÓM (/api/get-group-data)
+# ==============================================================================
+def _day_numbers(dates):
+    """Ngày -> số ngày kể từ 1970 (int64), NaT -> NO_DAY."""
+    days = pd.DatetimeIndex(dates).normalize()
+    return np.where(days.isna(), NO_DAY, days.asi8 // 86_400_000_000_000)
+
+
+class GroupCube:
+    """
+    Gộp mọi dòng ticket/zalo của kỳ này + kỳ trước thành 1 bảng nhỏ
+    (kỳ, file, bitmask tag, nhân viên, ngày) -> số dòng, groupby đúng 1 lần.
+    Mọi con số của API nhóm (SUBIZ/ZALO/BHXH, từng sản phẩm, sản phẩm khác, bảng nhân viên)
+    chỉ còn là AND bit + cộng trên bảng nhỏ này -> thêm sản phẩm vào config gần như không tốn thêm.
+    db / db_prev: {tên file: frame đã lọc theo kỳ}, frame có cột Tag_Bits.
+    """
+
+    def __init__(self, tag_bits, db, db_prev):
+        self.tag_bits = tag_bits
+        parts = []
+        for period, frames in enumerate((db, db_prev)):
+            order = 0  # Số thứ tự dòng như thể concat các file theo GROUP_SOURCES
+            for src, (_, _, key) in enumerate(GROUP_SOURCES):
+                df = frames.get(key)
+                if df is None or df.empty: continue
+                n = len(df)
+                parts.append(pd.DataFrame({
+                    "period": period,
+                    "src": src,
+                    "bits": tag_bits._values(df) if TAG_BITS_COLUMN in df.columns else np.zeros(n, dtype=np.int32),
+                    "agent": df['Nhân viên hệ thống'].to_numpy(dtype=object) if 'Nhân viên hệ thống' in df.columns else None,
+                    "day": _day_numbers(df['Ngay_Cào']) if 'Ngay_Cào' in df.columns else NO_DAY,
+                    "order": np.arange(order, order + n),
+                }))
+                order += n
+
+        if parts:
+            rows = pd.concat(parts, ignore_index=True)
+            rows['agent'], self.agent_names = pd.factorize(rows['agent'])  # Trống/NaN -> -1
+        else:
+            rows = pd.DataFrame({c: pd.Series(dtype=np.int64) for c in ["period", "src", "bits", "agent", "day", "order"]})
+            self.agent_names = np.array([], dtype=object)
+
+        # Groupby 1 lần ra ô chi tiết (cho bảng nhân viên), 2 bảng nhỏ hơn chỉ là cộng dồn từ đó
+        cells = rows.groupby(["period", "src", "bits", "agent", "day"], sort=False).agg(
+            n=("order", "size"), first=("order", "min")).reset_index()
+        by_day = cells.groupby(["period", "src", "bits", "day"], sort=False)['n'].sum().reset_index()
+        totals = by_day.groupby(["period", "src", "bits"], sort=False)['n'].sum().reset_index()
+        self.cells = {c: cells[c].to_numpy() for c in cells.columns}
+        self.by_day = {c: by_day[c].to_numpy() for c in by_day.columns}
+        self.totals = {c: totals[c].to_numpy() for c in totals.columns}
+
+    def _pick(self, table, period, kinds, channels=GROUP_CHANNELS, patterns=None, only=True):
+        """Chọn ô theo kỳ/loại/kênh; patterns: only=True giữ dòng khớp tag (filter_by_tag), False bỏ dòng khớp."""
+        src_ok = np.array([c in channels and k in kinds for c, k, _ in GROUP_SOURCES])
+        sel = (table['period'] == period) & src_ok[table['src']]
+        if patterns is not None:
+            hit = (table['bits'] & self.tag_bits.bits_of(patterns)) != 0
+            sel &= hit if only else ~hit
+        return sel
+
+    def count(self, period, kinds, channels=GROUP_CHANNELS, patterns=None, only=True):
+        return int(self.totals['n'][self._pick(self.totals, period, kinds, channels, patterns, only)].sum())
+
+    def section(self, channels, patterns, only):
+        """Khối growth_stats (SUBIZ / ZALO / BHXH): in/out/miss/sla + total, kèm tăng trưởng so với kỳ trước."""
+        stats = {}
+        curr = {k: self.count(0, [k], channels, patterns, only) for k in ("in", "out", "miss", "sla")}
+        prev = {k: self.count(1, [k], channels, patterns, only) for k in ("in", "out", "miss", "sla")}
+        total = curr["in"] + curr["out"] + curr["miss"]
+        stats["total"] = total
+        stats["total_g"] = calc_growth(total, prev["in"] + prev["out"] + prev["miss"])
+        for k in ("in", "out", "miss", "sla"):
+            stats[k] = curr[k]
+            stats[f"{k}_g"] = calc_growth(curr[k], prev[k])
+        return stats
+
+    def product(self, patterns, only=True):
+        """1 dòng sản phẩm (cả 2 kênh): in/out/miss/sla kỳ này + growth của in+out+miss."""
+        curr = {k: self.count(0, [k], GROUP_CHANNELS, patterns, only) for k in ("in", "out", "miss", "sla")}
+        total = curr["in"] + curr["out"] + curr["miss"]
+        curr["growth"] = calc_growth(total, self.count(1, ["in", "out", "miss"], GROUP_CHANNELS, patterns, only))
+        return curr
+
+    def daily(self, date_range, kinds, channels=GROUP_CHANNELS, patterns=None, only=True):
+        """Số dòng kỳ này theo từng ngày của date_range (theo Ngay_Cào)."""
+        sel = self._pick(self.by_day, 0, kinds, channels, patterns, only)
+        per_day = pd.Series(self.by_day['n'][sel]).groupby(self.by_day['day'][sel]).sum()
+        return [int(v) for v in per_day.reindex(_day_numbers(date_range), fill_value=0)]
+
+    def employees(self, channels, patterns, only):
+        """Bảng nhân viên in/out/sla, thứ tự y như value_counts cũ (nhiều lượt trước, hòa thì ai gặp trước đứng trước)."""
+        stats = {}
+        for kind in ("in", "out", "sla"):
+            cells = self.cells
+            sel = self._pick(cells, 0, [kind], channels, patterns, only) & (cells['agent'] >= 0)
+            if not sel.any(): continue
+            agg = pd.DataFrame({"agent": cells['agent'][sel], "n": cells['n'][sel], "first": cells['first'][sel]}) \
+                .groupby("agent").agg(n=("n", "sum"), first=("first", "min")).sort_values("first")
+            # value_counts = đếm theo thứ tự gặp đầu tiên rồi sort_values giảm dần -> làm y chang
+            counts = pd.Series(agg['n'].to_numpy(), index=self.agent_names[agg.index.to_numpy()]).sort_values(ascending=False)
+            for name, val in counts.items():
+                if not name or str(name) == "nan": continue
+                if name not in stats: stats[name] = {"name": name, "in": 0, "out": 0, "sla": 0}
+                stats[name][kind] += int(val)
+        return list(stats.values())
+
+
+
+class DailySeries:
+    """
+    Biểu đồ số dòng theo ngày cho 1 request (thay get_daily_counts): mỗi frame đếm đúng 1 lần
+    bằng bincount trên số ngày, list frame hỏi lại (daily_call_in với call_traffic.in...) thì trả luôn.
+    Nhớ theo id của frame nên chỉ dùng trong 1 request rồi bỏ (có giữ tham chiếu để id không bị tái dùng).
+    """
+
+    def __init__(self, date_range):
+        self.index = pd.Index(_day_numbers(date_range))
+        self._frames = {}
+        self._lists = {}
+        self._keep = []
+
+    def _count(self, df, col):
+        key = (id(df), col)
+        if key not in self._frames:
+            pos = self.index.get_indexer(_day_numbers(df[col]))
+            self._frames[key] = np.bincount(pos[pos >= 0], minlength=len(self.index))
+        return self._frames[key]
+
+    def __call__(self, df_list):
+        """Số dòng theo từng ngày của cả list (như concat lại), đếm theo Ngay_Cào, không có thì Date_Obj."""
+        key = tuple(id(df) for df in df_list)
+        if key not in self._lists:
+            self._keep.extend(df_list)
+            col = next((c for c in ('Ngay_Cào', 'Date_Obj') if any(c in df.columns for df in df_list)), None)
+            counts = np.zeros(len(self.index), dtype=np.int64)
+            for df in df_list:
+                if col and col in df.columns: counts += self._count(df, col)
+            self._lists[key] = [int(v) for v in counts]
+        return list(self._lists[key])
+
+# ==============================================================================
+# 5. SCATTER GIỜ PHÁT SINH CHO DASHBOARD NHÓM (VECTOR HÓA)
+# ==============================================================================
+def parse_times(values):
+    """
+    Cột thời gian -> datetime64, mỗi ô ra y như pd.to_datetime(str(ô), errors='coerce') cũ.
+    Chuỗi kiểu ISO (2026-01-05 10:20[:30]) parse 1 phát bằng C, còn sót kiểu lạ mới parse từng ô.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values): return values
+    text = values.astype(str)
+    out = pd.to_datetime(text, format='ISO8601', errors='coerce')
+    rest = out.isna().to_numpy()
+    if rest.any(): out[rest] = pd.to_datetime(text[rest], format='mixed', errors='coerce')
+    return out
+
+
+def scatter_points(df, date_labels, day_fallback=False):
+    """
+    Chấm scatter: x = vị trí ngày cào trong date_labels, y = giờ + phút/60 của cột thời gian.
+    Bản vector hóa của vòng iterrows cũ, cùng điểm cùng thứ tự.
+    day_fallback=True (run_bc): dòng không có Ngay_Cào thì lấy ngày của chính cột thời gian.
+    """
+    if df.empty: return []
+    time_col = 'Thời gian' if 'Thời gian' in df.columns else ('Thời gian tạo' if 'Thời gian tạo' in df.columns else None)
+    if not time_col: return []
+
+    times = parse_times(df[time_col])
+    if 'Ngay_Cào' in df.columns: days = df['Ngay_Cào']
+    else: days = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    if day_fallback: days = days.where(days.notna(), times)
+
+    x = pd.Index(_day_numbers(pd.to_datetime(date_labels))).get_indexer(_day_numbers(days))
+    keep = (x >= 0) & times.notna().to_numpy()
+    y = (times.dt.hour + times.dt.minute / 60.0).to_numpy()[keep]
+    return [{"x": xv, "y": yv} for xv, yv in zip(x[keep].tolist(), y.tolist())]
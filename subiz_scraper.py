@@ -0,0 +1,592 @@
+import os
+import re
+import json
+import time
+import base64
+import datetime
+import queue
+import threading
+from collections import defaultdict
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
+# ==============================================================================
+# SUBIZ SCRAPER - ĐỒ NGHỀ CÀO DÙNG CHUNG CHO 1.py / 2.py / 3.py
+# ==============================================================================
+
+# Cào song song: SCRAPE_WORKERS worker, mỗi worker giữ riêng 1 driver.
+# Worker thứ i bám DEBUGGER_ADDRESSES[i % số địa chỉ]; dư worker thì mở thêm tab trong Chrome đó.
+# Tab nền bị Chrome bóp chậm thì bật thêm Chrome khác (--remote-debugging-port=9223, ...) rồi thêm vào đây.
+# launcher.py chạy song song 1/2/3.py thì truyền SUBIZ_DEBUGGERS riêng cho từng script (mỗi đứa 1 Chrome)
+DEBUGGER_ADDRESSES = [a.strip() for a in os.environ.get("SUBIZ_DEBUGGERS", "127.0.0.1:9222").split(",") if a.strip()]
+
+# Chrome Debugger đại ca bật sẵn
+DEBUGGER_ADDRESS = DEBUGGER_ADDRESSES[0]
+SCRAPE_WORKERS = 1  # 1 = chạy tuần tự 1 tab như cũ
+
+# Sổ checkpoint: job nào cào xong là ghi liền (kèm dòng) ra đây, sập giữa chừng chạy lại khỏi cào lại
+CHECKPOINT_DIR = "scrape_checkpoints"
+
+# "dom": cào kiểu cũ đọc từng ô trên bảng
+# "network": đọc thẳng JSON mà trang report tự gọi API (qua performance log của Chrome),
+#            lần đầu mỗi loại trang sẽ cào thêm DOM để đối chiếu, lệch là tự quay về DOM
+SCRAPE_MODE = "dom"
+
+# Nhận diện response API của từng loại trang (so với URL của request XHR)
+NETWORK_URL_PATTERNS = {
+    "convo": re.compile(r"subiz.*(convo|conversation)", re.I),
+    "call": re.compile(r"subiz.*call", re.I),
+}
+
+# Đường dẫn field trong 1 bản ghi JSON -> field chuẩn hóa (thử lần lượt, cái nào có thì lấy)
+NETWORK_FIELD_MAP = {
+    "customer": ["user.fullname", "user.name", "user.display_name", "user_name", "fullname", "name"],
+    "tags": ["tags", "tag_titles", "labels"],
+    "agent": ["agent.fullname", "agent.name", "agent_name", "assigned_agent.fullname", "member.fullname"],
+    "created": ["created", "created_time", "created_at"],
+    "channel": ["channel", "channel_type"],
+    "phone": ["from_number", "phone", "number", "contact.phone", "user.phone"],
+    "status": ["status_text", "status", "state"],
+    "duration": ["duration_sec", "duration", "talk_duration"],
+}
+NETWORK_TOTAL_KEYS = ["total", "total_count", "count", "total_hits"]
+
+# Giờ trong JSON là epoch -> in ra đúng kiểu title của thẻ span trên bảng
+NETWORK_TIME_FORMAT = "%H:%M %d/%m/%Y"
+NETWORK_TIMEOUT = 20
+
+# Trạng thái đối chiếu của chế độ network theo loại trang: None (chưa kiểm) / "ok" / "off"
+NETWORK_STATUS = {}
+
+# Thời gian chờ tối đa (giây) theo loại trang, hết giờ mới bỏ cuộc:
+#   page_load   : chờ dòng "trong tổng số N" sau driver.get (trang trống thì chờ hết chừng này,
+#                 để bằng đúng mức sleep cũ nên không bao giờ chậm hơn bản cũ)
+#   rows_stable : chờ số dòng ngừng tăng sau khi cuộn
+#   next_page   : chờ bảng đổi nội dung sau khi bấm trang sau
+WAIT_TIMEOUTS = {
+    "convo": {"page_load": 10, "rows_stable": 8, "next_page": 15},
+    "call":  {"page_load": 6,  "rows_stable": 8, "next_page": 15},
+}
+WAIT_POLL = 0.25
+ROWS_STABLE_POLLS = 3  # số lần đếm liên tiếp không đổi thì coi như đã load xong
+
+# Thời gian chờ thực tế: (loại trang, kiểu chờ) -> [giây, ...] để đại ca tinh chỉnh timeout
+WAIT_STATS = defaultdict(list)
+
+# Khóa chống trùng: ghép các field này thành 1 khóa hash. Tra theo loại dữ liệu trước
+# (vd "Miss_Call"), không có thì theo loại trang; không khai báo gì thì so nguyên cả item như cũ.
+DEDUP_KEYS = {
+    "convo": ("Khách hàng", "Thời gian"),
+    "call": ("SDT", "Thời gian tạo"),
+}
+# Số dòng trùng đã bỏ qua theo loại dữ liệu (cuộn xong đọc lại cả bảng nên trùng nhiều là bình thường)
+DEDUP_STATS = defaultdict(int)
+_STATS_LOCK = threading.Lock()
+
+# ==============================================================================
+# 1. KẾT NỐI CHROME
+# ==============================================================================
+def connect_driver(address=DEBUGGER_ADDRESS):
+    """Bám vào Chrome Debugger đang chạy. Chế độ network thì bật thêm performance log."""
+    options = Options()
+    options.add_experimental_option("debuggerAddress", address)
+    if SCRAPE_MODE == "network":
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return webdriver.Chrome(options=options)
+
+# ==============================================================================
+# 2. CHỜ THEO SỰ KIỆN (THAY CHO time.sleep CỐ ĐỊNH)
+# ==============================================================================
+ROW_COUNT_JS = """
+let rows = document.querySelectorAll('table.scroll-table tbody tr');
+if (!rows.length) rows = document.querySelectorAll('table.scroll-table tr');
+return rows.length;
+"""
+# Chữ ký bảng = số dòng + nội dung dòng đầu, đổi trang là chữ ký đổi
+SIGNATURE_JS = """
+let rows = document.querySelectorAll('table.scroll-table tbody tr');
+if (!rows.length) rows = document.querySelectorAll('table.scroll-table tr');
+return rows.length + '|' + (rows.length ? rows[0].innerText : '');
+"""
+
+
+def _timeout(page_type, name):
+    return WAIT_TIMEOUTS.get(page_type, WAIT_TIMEOUTS["convo"])[name]
+
+
+def _timed_wait(driver, page_type, name, condition):
+    """Chạy WebDriverWait, ghi lại thời gian chờ thật. Hết giờ thì trả None."""
+    t0 = time.perf_counter()
+    try:
+        return WebDriverWait(driver, _timeout(page_type, name), poll_frequency=WAIT_POLL).until(condition)
+    except TimeoutException:
+        return None
+    finally:
+        WAIT_STATS[(page_type, name)].append(time.perf_counter() - t0)
+
+
+def _read_total(driver):
+    """Đọc N trong 'trong tổng số N' (hoặc ô phân trang), chưa có thì trả False cho WebDriverWait chờ tiếp."""
+    try:
+        el = driver.find_element(By.XPATH, "//*[contains(text(), 'trong tổng số')]")
+        match = re.search(r"tổng số\s+(\d+)", el.text)
+        if match: return int(match.group(1))
+    except Exception:
+        pass
+    try:
+        return int(driver.find_element(By.CSS_SELECTOR, ".lead-actions__paginate-info b:last-child").text)
+    except Exception:
+        return False
+
+
+def open_report(driver, url, page_type):
+    """Mở trang report, chờ tới khi hiện tổng số dòng. Trang trống/hết giờ thì trả 0."""
+    driver.get(url)
+    total = _timed_wait(driver, page_type, "page_load", _read_total)
+    return total or 0
+
+
+def wait_rows_stable(driver, page_type):
+    """Sau khi cuộn: chờ tới khi số dòng đứng yên vài nhịp liên tiếp (lazy-load xong)."""
+    state = {"count": -1, "same": 0}
+
+    def stable(d):
+        count = d.execute_script(ROW_COUNT_JS)
+        state["same"] = state["same"] + 1 if count == state["count"] else 0
+        state["count"] = count
+        return count > 0 and state["same"] >= ROWS_STABLE_POLLS - 1
+
+    _timed_wait(driver, page_type, "rows_stable", stable)
+    return state["count"]
+
+
+def click_next_page(driver, page_type):
+    """Bấm trang sau rồi chờ bảng đổi nội dung. Hết trang hoặc bảng không đổi thì trả False."""
+    try:
+        next_btn = driver.find_element(By.CSS_SELECTOR, ".lead-actions__paginate button:last-child")
+        if next_btn.get_attribute("disabled"): return False
+        before = driver.execute_script(SIGNATURE_JS)
+        driver.execute_script("arguments[0].click();", next_btn)
+    except Exception:
+        return False
+    return bool(_timed_wait(driver, page_type, "next_page", lambda d: d.execute_script(SIGNATURE_JS) != before))
+
+
+def print_scrape_stats():
+    """In bảng thời gian chờ thực tế (để chỉnh WAIT_TIMEOUTS) và số dòng trùng đã bỏ."""
+    if WAIT_STATS:
+        print("\n⏱️ THỜI GIAN CHỜ THỰC TẾ (giây):")
+        for (page_type, name), secs in sorted(WAIT_STATS.items()):
+            print(f"   - {page_type:<6} {name:<12} lần={len(secs):<5} tb={sum(secs) / len(secs):.2f}  "
+                  f"max={max(secs):.2f}  tổng={sum(secs):.0f}")
+    if DEDUP_STATS:
+        print("♻️ DÒNG TRÙNG ĐÃ BỎ QUA:")
+        for data_type, count in sorted(DEDUP_STATS.items()):
+            print(f"   - {data_type:<22} {count}")
+
+# ==============================================================================
+# 3. ĐỌC CẢ TRANG BẰNG 1 LẦN execute_script (THAY VÌ 6-10 LẦN GỌI MỖI DÒNG)
+# ==============================================================================
+# Mỗi dòng trả về đủ nguyên liệu cho cả 4 kiểu bảng, Python chỉ việc nhặt:
+#   user       : chữ trong span.ml-3 (tên khách), null nếu không có
+#   tags       : list chữ trong .convo_tag__title của cả dòng
+#   last_title : title của span[title] trong ô cuối (giống XPath .//td[last()]//span[@title])
+#   cells      : từng ô td: text, content (textContent), img (title của img), span (title của span đầu),
+#                icon (class của thẻ i đầu), tags (tag trong riêng ô đó); thiếu thẻ thì null
+ROWS_JS = """
+let rows = document.querySelectorAll('table.scroll-table tbody tr');
+if (!rows.length) rows = document.querySelectorAll('table.scroll-table tr');
+const txt = el => (el.innerText || '').trim();
+const tagList = el => Array.from(el.querySelectorAll('.convo_tag__title')).map(txt);
+return Array.from(rows).map(row => {
+    const user = row.querySelector('span.ml-3');
+    const own = row.querySelectorAll(':scope > td');
+    const lastSpan = own.length ? own[own.length - 1].querySelector('span[title]') : null;
+    return {
+        user: user ? txt(user) : null,
+        tags: tagList(row),
+        last_title: lastSpan ? lastSpan.title : null,
+        cells: Array.from(row.querySelectorAll('td')).map(td => {
+            const img = td.querySelector('img'), span = td.querySelector('span'), icon = td.querySelector('i');
+            return {
+                text: txt(td),
+                content: (td.textContent || '').trim(),
+                img: img ? img.title : null,
+                span: span ? span.title : null,
+                icon: icon ? (icon.getAttribute('class') || '') : null,
+                tags: tagList(td)
+            };
+        })
+    };
+});
+"""
+
+
+def extract_rows(driver):
+    """Lấy toàn bộ dòng đang hiện trên bảng report trong đúng 1 round trip."""
+    return driver.execute_script(ROWS_JS) or []
+
+# ==============================================================================
+# 4. CHỐNG TRÙNG O(1) BẰNG KHÓA HASH
+# ==============================================================================
+class RowDeduper:
+    """
+    Gom item theo thứ tự gặp, bỏ dòng trùng bằng set khóa (thay cho 'if item not in list'
+    quét cả list mỗi dòng -> bậc 2 theo số dòng).
+    """
+
+    def __init__(self, data_type, kind=None):
+        self.data_type = data_type
+        self.fields = DEDUP_KEYS.get(data_type) or DEDUP_KEYS.get(kind)
+        self.items = []
+        self.duplicates = 0
+        self._seen = set()
+
+    def key(self, item):
+        if self.fields: return tuple(item.get(f) for f in self.fields)
+        return tuple(sorted(item.items()))
+
+    def add(self, item):
+        """Thêm item, trùng thì đếm rồi bỏ. Trả True nếu là dòng mới."""
+        key = self.key(item)
+        if key in self._seen:
+            self.duplicates += 1
+            return False
+        self._seen.add(key)
+        self.items.append(item)
+        return True
+
+    def __len__(self):
+        return len(self.items)
+
+    def finish(self):
+        """Chốt sổ: cộng số dòng trùng vào DEDUP_STATS, trả list item."""
+        with _STATS_LOCK:
+            DEDUP_STATS[self.data_type] += self.duplicates
+        return self.items
+
+# ==============================================================================
+# 5. CHẾ ĐỘ NETWORK: NGHE LÉN XHR QUA PERFORMANCE LOG
+# ==============================================================================
+class NetworkTap:
+    """
+    Đọc performance log của chromedriver, gom các response JSON khớp pattern.
+    Body chỉ lấy được sau Network.loadingFinished nên phải nhớ requestId từ lúc responseReceived.
+    """
+
+    def __init__(self, driver, pattern):
+        self.driver = driver
+        self.pattern = pattern
+        self._pending = {}
+
+    def drain(self):
+        """Bỏ hết log cũ (gọi trước khi mở trang mới)."""
+        try: self.driver.get_log("performance")
+        except Exception: pass
+        self._pending.clear()
+
+    def poll(self):
+        """Trả về list JSON body của các response đã tải xong kể từ lần poll trước."""
+        bodies = []
+        for entry in self.driver.get_log("performance"):
+            try: msg = json.loads(entry["message"])["message"]
+            except Exception: continue
+            method, params = msg.get("method"), msg.get("params", {})
+            if method == "Network.responseReceived":
+                resp = params.get("response", {})
+                if "json" in resp.get("mimeType", "") and self.pattern.search(resp.get("url", "")):
+                    self._pending[params["requestId"]] = resp["url"]
+            elif method == "Network.loadingFinished" and params.get("requestId") in self._pending:
+                self._pending.pop(params["requestId"])
+                try:
+                    body = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": params["requestId"]})
+                    text = body.get("body", "")
+                    if body.get("base64Encoded"): text = base64.b64decode(text).decode("utf-8")
+                    bodies.append(json.loads(text))
+                except Exception:
+                    continue
+        return bodies
+
+    def wait(self, timeout=NETWORK_TIMEOUT):
+        """Chờ tới khi có ít nhất 1 response JSON khớp (hết giờ thì trả list rỗng)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            bodies = self.poll()
+            if bodies: return bodies
+            time.sleep(0.2)
+        return []
+
+
+def _dig(obj, path):
+    for part in path.split("."):
+        if not isinstance(obj, dict) or part not in obj: return None
+        obj = obj[part]
+    return obj
+
+
+def find_records(body):
+    """Tìm list bản ghi (list dict dài nhất) trong JSON, API bọc kiểu gì cũng moi ra được."""
+    best = []
+    stack = [body]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            if node and all(isinstance(x, dict) for x in node) and len(node) > len(best): best = node
+            stack.extend(node)
+        elif isinstance(node, dict):
+            stack.extend(node.values())
+    return best
+
+
+def find_total(body):
+    if not isinstance(body, dict): return None
+    for key in NETWORK_TOTAL_KEYS:
+        val = _dig(body, key)
+        if isinstance(val, (int, float)): return int(val)
+    for val in body.values():
+        if isinstance(val, dict):
+            found = find_total(val)
+            if found is not None: return found
+    return None
+
+
+def _format_time(val):
+    if isinstance(val, (int, float)) and val > 0:
+        seconds = val / 1000 if val > 1e11 else val   # epoch ms hoặc s
+        return datetime.datetime.fromtimestamp(seconds).strftime(NETWORK_TIME_FORMAT)
+    return "N/A" if val in (None, "") else str(val)
+
+
+def _format_duration(val):
+    """Số giây -> 'X phút Y giây' giống chữ trên bảng (đã chuẩn hóa '50 giây' -> '0 phút 50 giây')."""
+    if isinstance(val, (int, float)):
+        total = int(val / 1000) if val > 100000 else int(val)
+        return f"{total // 60} phút {total % 60} giây"
+    return "" if val is None else str(val)
+
+
+def _format_tags(val):
+    if isinstance(val, list):
+        names = [(t.get("title") or t.get("name") or "") if isinstance(t, dict) else str(t) for t in val]
+        return ", ".join(n.strip() for n in names if n)
+    return "" if val is None else str(val)
+
+
+def normalize_record(record):
+    """Bản ghi JSON thô -> dict field chuẩn hóa (customer, tags, agent, created, ...)."""
+    out = {}
+    for field, paths in NETWORK_FIELD_MAP.items():
+        val = None
+        for path in paths:
+            val = _dig(record, path)
+            if val not in (None, ""): break
+        if isinstance(val, dict): val = val.get("fullname") or val.get("name") or val.get("title")
+        out[field] = val
+    out["created"] = _format_time(out["created"])
+    out["duration"] = _format_duration(out["duration"])
+    out["tags"] = _format_tags(out["tags"])
+    for field in ("customer", "agent", "channel", "phone", "status"):
+        out[field] = "" if out[field] is None else str(out[field]).strip()
+    return out
+
+
+def network_scrape(driver, url, kind, data_type, to_item):
+    """
+    Mở trang, đọc JSON các trang report rồi đổi sang item qua to_item(field_chuẩn_hóa)
+    (to_item trả None thì bỏ dòng đó). Không bắt được response nào thì trả None để quay về DOM.
+    """
+    tap = NetworkTap(driver, NETWORK_URL_PATTERNS[kind])
+    tap.drain()
+    driver.get(url)
+    items = RowDeduper(data_type, kind)
+    total, got_any = None, False
+    while True:
+        bodies = tap.wait()
+        if not bodies: break
+        got_any = True
+        for body in bodies:
+            if total is None: total = find_total(body)
+            for record in find_records(body):
+                item = to_item(normalize_record(record))
+                if item: items.add(item)
+        if total is not None and len(items) >= total: break
+        if not click_next_page(driver, kind): break
+    return items.finish() if got_any else None
+
+
+def _same_items(a, b):
+    key = lambda item: json.dumps(item, sort_keys=True, ensure_ascii=False)
+    return sorted(map(key, a)) == sorted(map(key, b))
+
+
+def scrape_with_network(driver, url, kind, data_type, to_item, dom_scrape):
+    """
+    Cào 1 trang report theo SCRAPE_MODE. dom_scrape() là hàm cào DOM kiểu cũ.
+    Chế độ network: lần đầu gặp loại trang có dữ liệu thì cào cả DOM để so, khớp thì tin
+    JSON từ đó về sau, lệch thì in ra mẫu lệch và dùng DOM cho cả phiên.
+    """
+    if SCRAPE_MODE != "network" or NETWORK_STATUS.get(kind) == "off":
+        return dom_scrape()
+
+    items = network_scrape(driver, url, kind, data_type, to_item)
+    if items is None:
+        print(f"      ⚠️ [Network] Không bắt được API trang {kind}, quay về cào DOM.")
+        return dom_scrape()
+    if NETWORK_STATUS.get(kind) == "ok":
+        return items
+
+    dom_items = dom_scrape()
+    if not dom_items and not items: return dom_items   # trang trống, lần sau kiểm tiếp
+    if _same_items(items, dom_items):
+        NETWORK_STATUS[kind] = "ok"
+        print(f"      ✅ [Network] JSON trang {kind} khớp DOM ({len(items)} dòng), từ giờ đọc JSON.")
+    else:
+        NETWORK_STATUS[kind] = "off"
+        print(f"      ⚠️ [Network] JSON trang {kind} lệch DOM ({len(items)} vs {len(dom_items)} dòng), dùng DOM cả phiên.")
+        if items and dom_items: print(f"         JSON: {items[0]}\n         DOM : {dom_items[0]}")
+    return dom_items
+
+# ==============================================================================
+# 6. CÀO SONG SONG NHIỀU TAB / NHIỀU CHROME
+# ==============================================================================
+class ScrapePool:
+    """
+    Hàng đợi job cào (1 job = 1 link report của 1 ngày/nhân viên/loại dữ liệu) chia cho N worker.
+    Mỗi worker sở hữu riêng 1 driver (1 tab), không bao giờ 2 luồng dùng chung 1 driver.
+    """
+
+    def __init__(self, workers=None, addresses=None):
+        self.workers = workers or SCRAPE_WORKERS
+        self.addresses = addresses or DEBUGGER_ADDRESSES
+        self.drivers = []
+        self._own_tabs = []
+
+    def start(self):
+        """Kết nối driver cho từng worker. Không worker nào kết nối được thì ném lỗi."""
+        connected = set()
+        for i in range(self.workers):
+            address = self.addresses[i % len(self.addresses)]
+            try:
+                driver = connect_driver(address)
+                if i >= len(self.addresses):
+                    # Cùng 1 Chrome với worker khác -> mở tab riêng cho mình
+                    driver.switch_to.new_window('tab')
+                    self._own_tabs.append(driver)
+                self.drivers.append(driver)
+                connected.add(address)
+            except Exception as e:
+                print(f"   ⚠️ Worker {i + 1} không bám được Chrome {address}: {e}")
+        if not self.drivers:
+            raise RuntimeError("Không kết nối được Chrome Debugger nào")
+        print(f"   🧵 Cào song song {len(self.drivers)} worker trên {len(connected)} Chrome")
+        return self
+
+    def run(self, jobs, daily_storage, journal=None, day=None):
+        """
+        jobs: list (data_type, nhãn, scrape_fn) với scrape_fn(driver) -> list item.
+        Kết quả đổ vào daily_storage[data_type] theo đúng thứ tự job, y như chạy tuần tự.
+        Có journal thì job đã ghi sổ của ngày này lấy luôn dòng trong sổ, job mới xong ghi sổ ngay.
+        Trả về list nhãn job bị lỗi (rỗng là ngon).
+        """
+        work = queue.Queue()
+        results = [None] * len(jobs)
+        resumed = 0
+        for idx, job in enumerate(jobs):
+            done = journal.get(day, job[1]) if journal else None
+            if done is not None:
+                results[idx] = done
+                resumed += 1
+            else:
+                work.put((idx, job))
+        if resumed: print(f"   📒 Lấy lại {resumed}/{len(jobs)} job ngày {day} từ sổ checkpoint")
+        failed = []
+
+        def worker(wid, driver):
+            while True:
+                try: idx, (data_type, label, scrape_fn) = work.get_nowait()
+                except queue.Empty: return
+                try:
+                    results[idx] = scrape_fn(driver) or []
+                    print(f"   👤 [W{wid}] {label}: {len(results[idx])} dòng")
+                    if journal: journal.record(day, data_type, label, results[idx])
+                except Exception as e:
+                    results[idx] = []
+                    failed.append(label)
+                    print(f"   🔥 [W{wid}] {label} lỗi: {e}")
+
+        threads = [threading.Thread(target=worker, args=(i + 1, d), name=f"scrape-w{i + 1}", daemon=True)
+                   for i, d in enumerate(self.drivers)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+        for (data_type, _, _), items in zip(jobs, results):
+            daily_storage[data_type].extend(items)
+        return failed
+
+    def close(self):
+        """Đóng mấy tab tự mở, tab gốc của đại ca giữ nguyên."""
+        for driver in self._own_tabs:
+            try: driver.close()
+            except Exception: pass
+
+# ==============================================================================
+# 7. SỔ CHECKPOINT (JSONL) - SẬP GIỮA CHỪNG CHẠY LẠI CÀO TIẾP JOB DỞ
+# ==============================================================================
+class ScrapeJournal:
+    """
+    Mỗi job cào xong ghi 1 dòng JSON: ngày, loại dữ liệu, nhãn job (nhân viên / loại), số dòng và cả các dòng.
+    Ghi kiểu append + fsync nên Chrome sập, mất điện cũng chỉ mất đúng job đang cào dở.
+    Ngày nào upload Drive xong thì finish_day() xóa khỏi sổ cho nhẹ.
+    """
+
+    def __init__(self, name, folder=CHECKPOINT_DIR):
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, f"{name}.jsonl")
+        self._lock = threading.Lock()
+        self._entries = {}
+        broken = False
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try: entry = json.loads(line)
+                    except ValueError:
+                        broken = True  # Dòng cuối ghi dở lúc sập thì bỏ
+                        continue
+                    self._entries[(entry["day"], entry["job"])] = entry
+        # Ghi lại sổ sạch sẽ, không thì dòng mới append dính vào đuôi dòng dở
+        if broken: self._rewrite()
+        if self._entries:
+            days = sorted({d for d, _ in self._entries})
+            print(f"📒 Sổ checkpoint {self.path}: {len(self._entries)} job đã cào xong ({', '.join(days)})")
+
+    def get(self, day, job):
+        """Dòng đã cào của job (list), chưa có trong sổ thì None."""
+        entry = self._entries.get((day, job))
+        return None if entry is None else [dict(item) for item in entry["items"]]
+
+    def record(self, day, data_type, job, items):
+        entry = {"day": day, "data_type": data_type, "job": job, "rows": len(items),
+                 "items": items, "at": datetime.datetime.now().isoformat(timespec="seconds")}
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries[(day, job)] = entry
+
+    def finish_day(self, day):
+        """Ngày đã lên Drive đủ thì gạch khỏi sổ (ghi file tạm rồi thay, không bao giờ để sổ nát)."""
+        with self._lock:
+            self._entries = {k: v for k, v in self._entries.items() if k[0] != day}
+            self._rewrite()
+
+    def _rewrite(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        os.replace(tmp, self.path)
@@ -0,0 +1,117 @@
+import os
+import sys
+import signal
+import threading
+import importlib.util
+from flask import jsonify, request, send_from_directory
+from drive_io import DataRefresher
+from api_cache import admin_allowed
+
+# ==============================================================================
+# CỔNG PRODUCTION - GỘP 1_map + 2_map CHẠY DƯỚI GUNICORN NHIỀU WORKER
+# ==============================================================================
+# Linux/VPS:   gunicorn -c gunicorn.conf.py wsgi:app
+#   - preload: process cha nạp data 1 lần, các worker fork ra dùng chung RAM (copy-on-write)
+#   - process cha giữ luồng hot reload; Drive có bản mới thì cha nạp lại rồi thay worker
+#     nhẹ nhàng (SIGHUP: worker cũ trả nốt request đang dở rồi mới nghỉ)
+#   - /api/admin/reload rơi vào worker nào cũng được, worker báo cha qua pipe
+# Windows:     python wsgi.py  (không có fork -> chạy waitress nhiều luồng nếu có cài, không thì Flask threaded)
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# Gom mấy lần đổi data sát nhau (map 1 + map 2 cùng đổi) thành 1 lần thay worker
+HUP_DELAY = 2.0
+
+# ==============================================================================
+# 1. GHÉP APP
+# ==============================================================================
+def import_module_from_file(file_name, module_name):
+    """Import file tên bắt đầu bằng số ('1_map.py'), Python thường không cho import kiểu này."""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(BASE_PATH, file_name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def build_app():
+    """App của map 1 làm chủ, ghép route của map 2 sang (trùng đường dẫn thì route map 1 thắng)."""
+    mod1 = import_module_from_file("1_map.py", "module_1")
+    mod2 = import_module_from_file("2_map.py", "module_2")
+    master_app = mod1.app
+
+    for rule in mod2.app.url_map.iter_rules():
+        if rule.endpoint == 'static': continue
+        master_app.add_url_rule(rule.rule, endpoint=f"mod2_{rule.endpoint}",
+                                view_func=mod2.app.view_functions[rule.endpoint], methods=rule.methods)
+
+    @master_app.route('/')
+    def index():
+        if os.path.exists(os.path.join(BASE_PATH, "Dashboard_Live.html")):
+            return send_from_directory(BASE_PATH, "Dashboard_Live.html")
+        return "<h1>⚠️ Server chạy OK nhưng thiếu file Dashboard_Live.html</h1>"
+
+    for name, mod in (("1_map", mod1), ("2_map", mod2)):
+        try: mod.load_all_data()
+        except Exception as e: print(f"⚠️ Chưa load được data {name}: {e}")
+    return master_app
+
+app = build_app()
+
+# ==============================================================================
+# 2. HOT RELOAD KHI CHẠY NHIỀU WORKER
+# ==============================================================================
+# Đầu ghi pipe báo process cha "check Drive đi" (b"C") hoặc "nạp lại hết" (b"F"), worker thừa hưởng lúc fork
+ADMIN_PIPE = None
+_hup_timer = None
+
+def _schedule_hup(name, changed):
+    """Data trong process cha vừa đổi -> hẹn SIGHUP để gunicorn thay worker bằng bản fork mới."""
+    global _hup_timer
+    if _hup_timer: _hup_timer.cancel()
+    _hup_timer = threading.Timer(HUP_DELAY, os.kill, (os.getpid(), signal.SIGHUP))
+    _hup_timer.daemon = True
+    _hup_timer.start()
+
+def _watch_admin_pipe(fd):
+    while True:
+        cmd = os.read(fd, 1)
+        if not cmd: return
+        try: DataRefresher.check_all(force=cmd == b"F")
+        except Exception as e: print(f"⚠️ [Admin] Nạp lại lỗi: {e}")
+
+def enable_master_reload():
+    """Gọi trong process cha của gunicorn (when_ready), trước khi fork worker."""
+    global ADMIN_PIPE
+    read_fd, ADMIN_PIPE = os.pipe()
+    DataRefresher.listeners.append(_schedule_hup)
+    threading.Thread(target=_watch_admin_pipe, args=(read_fd,), name="admin-reload", daemon=True).start()
+
+_local_admin_reload = app.view_functions['admin_reload']
+
+def admin_reload():
+    """Worker không tự nạp (RAM riêng, worker khác không thấy) mà đẩy việc cho process cha."""
+    if ADMIN_PIPE is None: return _local_admin_reload()
+    if not admin_allowed(): return jsonify({"error": "Sai token"}), 403
+    os.write(ADMIN_PIPE, b"F" if request.args.get('full') == '1' else b"C")
+    return jsonify({"queued": True}), 202
+
+app.view_functions['admin_reload'] = admin_reload
+
+# ==============================================================================
+# 3. CHẠY TRÊN WINDOWS (KHÔNG CÓ GUNICORN)
+# ==============================================================================
+if __name__ == '__main__':
+    host = os.environ.get("WEB_HOST", "0.0.0.0")
+    port = int(os.environ.get("WEB_PORT", "5000"))
+    threads = int(os.environ.get("WEB_THREADS", "8"))
+    try:
+        from waitress import serve
+    except ImportError:
+        serve = None
+
+    print(f"🚀 SERVER ĐÃ SẴN SÀNG TẠI {host}:{port}!")
+    if serve:
+        serve(app, host=host, port=port, threads=threads)
+    else:
+        print("⚠️ Chưa cài waitress (pip install waitress), tạm chạy Flask threaded")
+        app.run(host=host, port=port, debug=False, threaded=True, use_reloader=False)